@@ -0,0 +1,222 @@
+# analytics.py
+# Query API over the cleaned datasets (the frames utils.load_data() returns): medal standings,
+# continent roll-ups, top athletes, age statistics and schedule slices. Plain Python, no
+# Streamlit runtime needed, so the same queries run in batch jobs, benchmarks and tests:
+#   api = Analytics.load()
+#   api.medal_standings(top=10)
+#   api.top_athletes({'continent': ['Europe']}, sort_by=['Gold'])
+# Only pandas, numpy and the data layer (datalayer.py) are imported. Pages use the shared
+# instance of the current data version, utils.get_analytics().
+import contextlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+import datalayer
+
+QUERY_CACHE_SIZE = 256
+# Multi-valued filters per dataset and the bridge resource they go through (see datalayer.FilterIndex)
+BRIDGES = {'athletes': {'sport': 'athlete_disciplines'}}
+SORT_COLUMNS = {'Gold': 'Gold Medal', 'Silver': 'Silver Medal', 'Bronze': 'Bronze Medal', 'Total': 'Total'}
+AGE_STATS = ['athletes', 'mean_age', 'median_age', 'min_age', 'max_age']
+
+class Analytics:
+    """
+    Queries over one version of the datasets. Derived structures (medal fact table, filter indexes,
+    discipline bridge, schedule intervals) are built on first use, or taken from `sources`,
+    {name: callable}, e.g. the app's per-table caches. Every query result goes through `cache`:
+    any object with get_or_build(key, build), bounded LRU (datalayer.FigureCache) by default.
+    Results are shared between callers, do not mutate them. `timer(label)` is a context manager
+    wrapped around every query (no-op by default; the app passes utils.profile).
+    `filters` follow the sidebar format ({'continent': [...], 'age': (low, high), ...});
+    None or a missing key keeps every row.
+    """
+    def __init__(self, athletes, medallists, nocs, events, schedule=None, cache=None, sources=None, timer=None):
+        self.athletes = athletes
+        self.medallists = medallists
+        self.nocs = nocs
+        self.events = events
+        self.schedule = schedule
+        self.cache = cache if cache is not None else datalayer.FigureCache(QUERY_CACHE_SIZE)
+        self.sources = sources or {}
+        self.timer = timer or (lambda label: contextlib.nullcontext())
+        self.resources = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, data_dir=datalayer.DATA_DIR, schedule=True, cache=None):
+        """Latest version of the CSVs in `data_dir` (through the snapshot when one exists)."""
+        frames = datalayer.DataStore(data_dir).refresh().frames
+        return cls(*frames, schedule=datalayer.read_schedule(data_dir) if schedule else None, cache=cache)
+
+    # --- Derived structures ---
+    def resource(self, name, *args):
+        key = (name,) + args
+        if key not in self.resources:
+            build = self.sources.get(name) or getattr(self, f'build_{name}')
+            value = build(*args)
+            with self.lock:
+                self.resources.setdefault(key, value)
+        return self.resources[key]
+
+    def build_athlete_disciplines(self):
+        return datalayer.build_athlete_disciplines(self.athletes)
+
+    def build_medal_facts(self):
+        return datalayer.build_medal_facts(self.medallists)
+
+    def build_filter_index(self, dataset):
+        frames = {'athletes': self.athletes, 'medallists': self.medallists, 'schedule': self.schedule}
+        df = self.resource('medal_facts') if dataset == 'medal_facts' else frames[dataset]
+        bridges = {key: self.resource(name) for key, name in BRIDGES.get(dataset, {}).items()}
+        return datalayer.FilterIndex(df, datalayer.FILTER_COLUMNS[dataset], bridges=bridges)
+
+    def build_schedule_intervals(self):
+        return datalayer.ScheduleIntervals(self.schedule)
+
+    def build_day_index(self):
+        """Day -> positions (ascending start time) of the sessions overlapping that (Paris) day."""
+        intervals = pd.IntervalIndex.from_arrays(self.schedule['start_date'], self.schedule['end_date'], closed='left')
+        by_day = {}
+        for day in sorted(self.schedule['Day'].unique()):
+            start = pd.Timestamp(day).tz_localize(datalayer.SCHEDULE_TIMEZONE)
+            window = pd.Interval(start, start + pd.Timedelta(days=1), closed='left')
+            by_day[day] = np.flatnonzero(intervals.overlaps(window))
+        return by_day
+
+    def rows(self, dataset, filters=None, ignore=()):
+        """Sorted row positions of `dataset` matching the filters."""
+        return self.resource('filter_index', dataset).select(filters or {}, ignore)
+
+    def query(self, name, build, filters=None, **params):
+        with self.timer(f'analytics:{name}'):
+            return self.cache.get_or_build(datalayer.figure_key(f'analytics/{name}', filters, **params), build)
+
+    # --- Medals ---
+    def medal_rollup(self, filters=None, by=('country',), ignore=(), medal_types=None):
+        """
+        Medal counts (team medals once) grouped by `by` (any of Continent, country,
+        discipline, event, medal_type): `by` + 'Medal_Count'.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        def build():
+            facts = self.resource('medal_facts')
+            medals = facts.iloc[self.rows('medal_facts', filters, ignore)]
+            if medal_types is not None:
+                medals = medals[medals['medal_type'].isin(medal_types)]
+            # Every dimension in `by` depends only on the medal, so one row per medal_id is enough
+            medals = medals.drop_duplicates(subset='medal_id')
+            return medals.groupby(by, observed=True).size().reset_index(name='Medal_Count')
+        return self.query('medal_rollup', build, filters, by=by, ignore=sorted(ignore), medal_types=medal_types)
+
+    def medal_breakdown(self, filters=None, by='country', ignore=(), medal_types=None):
+        """Wide table: `by` + 'Gold Medal', 'Silver Medal', 'Bronze Medal', 'Total'."""
+        by = [by] if isinstance(by, str) else list(by)
+        def build():
+            counts = self.medal_rollup(filters, by + ['medal_type'], ignore, medal_types)
+            table = counts.pivot_table(index=by, columns='medal_type', values='Medal_Count', aggfunc='sum',
+                                       fill_value=0, observed=True)
+            table.columns = table.columns.astype(str)
+            table = table.reindex(columns=datalayer.MEDAL_TYPES, fill_value=0)
+            table['Total'] = table[datalayer.MEDAL_TYPES].sum(axis=1)
+            return table.rename_axis(columns=None).reset_index()
+        return self.query('medal_breakdown', build, filters, by=by, ignore=sorted(ignore), medal_types=medal_types)
+
+    def medal_standings(self, filters=None, by='country', medal_types=None, top=None):
+        """medal_breakdown() by Total (ties keep the breakdown order), with a 1-based 'rank', first `top` rows."""
+        def build():
+            table = self.medal_breakdown(filters, by, medal_types=medal_types)
+            table = table.sort_values('Total', ascending=False, kind='stable').reset_index(drop=True)
+            table.insert(0, 'rank', table['Total'].rank(method='min', ascending=False).astype(int))
+            return table.head(top) if top is not None else table
+        return self.query('medal_standings', build, filters, by=by, medal_types=medal_types, top=top)
+
+    def continent_rollup(self, filters=None):
+        """Medal breakdown per Continent, the continent with the most medals first."""
+        return self.medal_standings(filters, 'Continent')
+
+    def top_athletes(self, filters=None, sort_by=('Total',), n=10):
+        """
+        Medal counts per athlete name (each medallist row, team members included), sorted
+        by `sort_by` (Gold / Silver / Bronze / Total, in priority order): name + medal
+        types + 'Total', first `n` rows.
+        """
+        sort_by = list(sort_by) or ['Total']
+        def build():
+            medals = self.medallists.iloc[self.rows('medallists', filters)]
+            table = medals.pivot_table(index='name', columns='medal_type', aggfunc='size', fill_value=0, observed=True)
+            table.columns = table.columns.astype(str)
+            table = table.reindex(columns=datalayer.MEDAL_TYPES, fill_value=0)
+            table['Total'] = table[datalayer.MEDAL_TYPES].sum(axis=1)
+            table = table.sort_values([SORT_COLUMNS[column] for column in sort_by], ascending=False)
+            return table.head(n).rename_axis(columns=None).reset_index()
+        return self.query('top_athletes', build, filters, sort_by=sort_by, n=n)
+
+    # --- Athletes ---
+    def athlete_rows(self, filters=None, sports=None):
+        """Athlete positions matching the filters, narrowed to athletes of any of `sports`."""
+        rows = self.rows('athletes', filters)
+        if sports:
+            bridge = self.resource('athlete_disciplines')
+            in_sports = bridge['row'].to_numpy()[bridge['discipline'].isin(sports).to_numpy()]
+            rows = np.intersect1d(rows, in_sports)
+        return rows
+
+    def age_stats(self, filters=None, by=None, sports=None):
+        """Age statistics of the selected athletes (see athlete_rows), one row per `by` group (or one row)."""
+        def build():
+            rows = self.athlete_rows(filters, sports)
+            ages = self.athletes['Age'].iloc[rows]
+            if by is None:
+                return pd.DataFrame([[len(ages), ages.mean(), ages.median(), ages.min(), ages.max()]], columns=AGE_STATS)
+            stats = ages.groupby(self.athletes[by].iloc[rows], observed=True).agg(['size', 'mean', 'median', 'min', 'max'])
+            stats.columns = AGE_STATS
+            return stats.reset_index()
+        return self.query('age_stats', build, filters, by=by, sports=sorted(sports or []))
+
+    def kpis(self, filters=None):
+        """Headline counts of the selection: athletes, countries, sports, medals, events."""
+        def build():
+            athletes = self.athletes.iloc[self.rows('athletes', filters)]
+            bridge = self.resource('athlete_disciplines')
+            sports = bridge['discipline'][np.isin(bridge['row'].to_numpy(), athletes.index.to_numpy())]
+            selected_sports = (filters or {}).get('sport')
+            if selected_sports is not None:
+                sports = sports[sports.isin(selected_sports)]
+            # Events are only narrowed by the sport filter
+            events = self.events[self.events['sport'].isin(selected_sports)] if selected_sports else self.events
+            return {
+                'athletes': len(athletes), 'countries': athletes['country'].nunique(), 'sports': sports.nunique(),
+                'medals': int(self.medal_rollup(filters, ['medal_type'])['Medal_Count'].sum()), 'events': len(events),
+            }
+        return self.query('kpis', build, filters)
+
+    # --- Schedule ---
+    def schedule_rows(self, sports=None, venues=None, day=None):
+        """
+        Schedule positions (ascending start time) of the sessions of `sports` at `venues`;
+        `day` keeps the sessions overlapping that (Paris) day, including ones past midnight.
+        """
+        def build():
+            rows = self.rows('schedule', {key: value for key, value in (('sport', sports), ('venue', venues)) if value is not None})
+            if day is not None:
+                rows = np.intersect1d(rows, self.resource('day_index').get(day, []), assume_unique=True)
+            return rows
+        return self.query('schedule_rows', build, sports=sorted(sports) if sports is not None else None,
+                          venues=sorted(venues) if venues is not None else None, day=day)
+
+    def schedule_slice(self, sports=None, venues=None, day=None):
+        """The schedule_rows() sessions as a DataFrame."""
+        return self.schedule.iloc[self.schedule_rows(sports, venues, day)]
+
+    def warm(self, filter_sets=(None,)):
+        """Runs the standard page queries for each filter dict, e.g. before the first request."""
+        for filters in filter_sets:
+            self.kpis(filters)
+            self.medal_standings(filters)
+            self.medal_breakdown(filters, 'discipline', ignore=('sport',))
+            self.continent_rollup(filters)
+            self.top_athletes(filters)
+            self.age_stats(filters, by='gender')
+        return self.cache.stats()
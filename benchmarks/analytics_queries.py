@@ -0,0 +1,61 @@
+# benchmarks/analytics_queries.py
+# Latency of the analytics API queries outside Streamlit (no runtime, no AppTest):
+#   cold  - empty query cache (derived structures such as the medal fact table already built)
+#   warm  - the same query answered from the query cache
+# The scenarios mirror bench_pages.py, expressed as filter dicts.
+#
+#   python benchmarks/analytics_queries.py            # table
+#   python benchmarks/analytics_queries.py --csv      # machine-readable
+import os
+import sys
+import time
+from datetime import date
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analytics import Analytics
+
+SCENARIOS = {
+    'no_filters': None,
+    'single_continent': {'continent': ['Europe']},
+    'country_sport': {'continent': ['Europe'], 'country': ['France'], 'sport': ['Athletics']},
+    'narrow_age': {'age': (20, 22)},
+}
+QUERIES = {
+    'kpis': lambda api, f: api.kpis(f),
+    'medal_standings': lambda api, f: api.medal_standings(f, top=10),
+    'continent_rollup': lambda api, f: api.continent_rollup(f),
+    'discipline_breakdown': lambda api, f: api.medal_breakdown(f, 'discipline', ignore=('sport',)),
+    'top_athletes': lambda api, f: api.top_athletes(f, sort_by=['Gold', 'Total']),
+    'age_stats': lambda api, f: api.age_stats(f, by='gender'),
+    'schedule_slice': lambda api, f: api.schedule_slice((f or {}).get('sport'), day=date(2024, 7, 28)),
+}
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    api = Analytics.load()
+    load_s = time.perf_counter() - start
+    build_s = timed(lambda: api.warm()) # builds the medal fact table, filter indexes and bridge once
+
+    rows = []
+    for scenario, filters in SCENARIOS.items():
+        for name, query in QUERIES.items():
+            api.cache.clear()
+            cold_s = timed(lambda: query(api, filters))
+            warm_s = min(timed(lambda: query(api, filters)) for _ in range(5))
+            rows.append({'scenario': scenario, 'query': name, 'cold_ms': 1000 * cold_s, 'warm_ms': 1000 * warm_s})
+    report = pd.DataFrame(rows)
+
+    if '--csv' in sys.argv[1:]:
+        print(report.to_csv(index=False), end='')
+    else:
+        print(f"load {load_s:.2f} s, derived structures {build_s:.2f} s")
+        print(report.round(3).to_string(index=False))
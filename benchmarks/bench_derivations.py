@@ -0,0 +1,80 @@
+# benchmarks/bench_derivations.py
+# Micro-benchmark: row-by-row .apply() vs the vectorized Age / Continent derivation.
+#
+#   python benchmarks/bench_derivations.py            # 11k (real size) and 1M rows
+#   python benchmarks/bench_derivations.py 50000      # custom sizes
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import utils
+
+DEFAULT_SIZES = (11_113, 1_000_000)
+
+
+def legacy_get_continent(country_name):
+    # The original per-row lookup (before the nocs.csv resolver): pycountry_convert on every call
+    try:
+        country_alpha2 = utils.pc.country_name_to_country_alpha2(country_name)
+        continent_code = utils.pc.country_alpha2_to_continent_code(country_alpha2)
+        return utils.pc.convert_continent_code_to_continent_name(continent_code)
+    except:
+        return "Other"
+
+
+def make_sample(n_rows, seed=0):
+    # Resample real (country, birth_date) pairs so the distinct-country ratio is realistic
+    source = os.path.join(utils.DATA_DIR, 'athletes.csv')
+    if not os.path.exists(source):
+        source = os.path.join(utils.DATA_DIR, 'medallists.csv')
+    real = pd.read_csv(source, usecols=['country', 'birth_date'])
+    rows = np.random.default_rng(seed).integers(0, len(real), n_rows)
+    sample = real.iloc[rows].reset_index(drop=True)
+    sample['birth_date'] = pd.to_datetime(sample['birth_date'], errors='coerce')
+    return sample
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(n_rows):
+    df = make_sample(n_rows)
+    today = utils.age_reference_date()
+    repeat = 3 if n_rows <= 100_000 else 1
+
+    cases = {
+        'Age': (
+            lambda: df['birth_date'].apply(utils.calculate_age, reference_date=today),
+            lambda: utils.calculate_ages(df['birth_date'], today),
+        ),
+        'Continent': (
+            lambda: df['country'].apply(legacy_get_continent),
+            lambda: utils.map_continents(df['country']),
+        ),
+    }
+
+    results = []
+    for name, (legacy, vectorized) in cases.items():
+        legacy_s = best_of(legacy, repeat)
+        vectorized_s = best_of(vectorized, repeat)
+        results.append((name, n_rows, legacy_s, vectorized_s, legacy_s / vectorized_s))
+    return results
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or DEFAULT_SIZES
+
+    print(f"{'column':<10} {'rows':>10} {'apply (s)':>11} {'vectorized (s)':>15} {'speedup':>9}")
+    for n_rows in sizes:
+        for name, rows, legacy_s, vectorized_s, speedup in run(n_rows):
+            print(f"{name:<10} {rows:>10,} {legacy_s:>11.4f} {vectorized_s:>15.4f} {speedup:>8.1f}x")
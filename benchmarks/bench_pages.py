@@ -0,0 +1,231 @@
+# benchmarks/bench_pages.py
+# Headless rerun latency of Home.py and every page, driven through Streamlit's AppTest.
+# Each page is replayed over a matrix of sidebar / local widget selections and timed:
+#   cold  - caches cleared (st.cache_data, st.cache_resource, figure cache), snapshot on disk kept
+#   warm  - the same selection rerun with every cache populated
+# Time is split into loading / filtering / figures by timing the utils and analytics entry points.
+#
+#   python benchmarks/bench_pages.py                              # table
+#   python benchmarks/bench_pages.py --json bench.json            # + machine-readable results
+#   python benchmarks/bench_pages.py --baseline bench.json        # compare, exit 1 on regression
+#   python benchmarks/bench_pages.py --pages 2 4 --scenarios no_filters single_continent
+import argparse
+import functools
+import glob
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+import datalayer
+import utils
+
+# Sidebar selections by widget label; 'checkboxes' unticks the page's first local checkbox (Gold)
+SCENARIOS = {
+    'no_filters': {},
+    'single_continent': {'Select Continent': ['Europe']},
+    'country_sport': {'Select Continent': ['Europe'], 'Select Country': ['France'], 'Select Sport': ['Athletics']},
+    'narrow_age': {'Select Age Range': (20, 22)},
+    'checkboxes': {'checkboxes': True},
+}
+
+# Entry points per phase: utils functions, or dotted paths from another module (every
+# analytics query goes through Analytics.query). Time is exclusive: a rollup called inside
+# a figure builder counts as filtering, not as figures.
+PHASES = {
+    'loading': ['load_data', 'load_schedule', 'get_schedule_lookups', 'get_medal_facts', 'get_facet_index',
+                'get_athlete_search', 'get_filter_index', 'datalayer.load_country_index', 'datalayer.country_lookup', 'load_venues',
+                'load_teams', 'get_athlete_disciplines', 'get_relation_graph', 'get_schedule_intervals',
+                'get_analytics'],
+    'filtering': ['apply_filters', 'analytics.Analytics.query', 'venue_occupancy', 'schedule_blocks'],
+    'figures': ['cached_figure'],
+}
+
+DEFAULT_TOLERANCE = 0.2   # relative slowdown flagged as a regression...
+NOISE_FLOOR_S = 0.01      # ...when it is also larger than this many seconds
+
+
+def resolve(name):
+    """(owner, attribute) of a PHASES entry: 'load_data' -> (utils, 'load_data')."""
+    module, *path = name.split('.') if '.' in name else ('utils', name)
+    return functools.reduce(getattr, path[:-1], importlib.import_module(module)), path[-1]
+
+
+class PhaseTimer:
+    """Wraps the PHASES functions and accumulates their exclusive time per phase."""
+    def __init__(self):
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.stack = []
+        self.originals = {}
+
+    def wrap(self, phase, func):
+        def timed(*args, **kwargs):
+            self.stack.append(0.0)  # time spent in nested timed calls
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = self.stack.pop()
+                self.totals[phase] += elapsed - nested
+                if self.stack:
+                    self.stack[-1] += elapsed
+        return timed
+
+    def install(self):
+        for phase, names in PHASES.items():
+            for name in names:
+                owner, attribute = resolve(name)
+                self.originals[name] = (owner, attribute, getattr(owner, attribute))
+                setattr(owner, attribute, self.wrap(phase, self.originals[name][2]))
+
+    def uninstall(self):
+        for owner, attribute, func in self.originals.values():
+            setattr(owner, attribute, func)
+
+    def reset(self):
+        self.totals = dict.fromkeys(PHASES, 0.0)
+
+
+def discover_pages():
+    return ['Home.py'] + sorted(os.path.relpath(p, ROOT) for p in glob.glob(os.path.join(ROOT, 'pages', '*.py')))
+
+
+# Country resolver caches (functools.cache), taken before PhaseTimer wraps the functions
+RESOLVER_CACHES = (datalayer.load_country_index, datalayer.country_lookup)
+
+def clear_caches():
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    for resolver in RESOLVER_CACHES:
+        resolver.cache_clear()
+
+
+def apply_scenario(at, selection):
+    """
+    Sets the scenario widgets on an AppTest that has run once. False if the page lacks
+    them (Home.py has no sidebar filters, only pages 2 and 4 have medal checkboxes).
+    """
+    for label, value in selection.items():
+        if label == 'checkboxes':
+            if not at.checkbox:
+                return False
+            at.checkbox[0].uncheck()
+            continue
+        widgets = [w for w in list(at.sidebar.multiselect) + list(at.sidebar.slider) if w.label == label]
+        if not widgets:
+            return False
+        widgets[0].set_value(value)
+    return True
+
+
+def timed_run(at, timer):
+    timer.reset()
+    start = time.perf_counter()
+    at.run()
+    wall = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return wall, dict(timer.totals)
+
+
+def bench_case(page, selection, timer, warm_runs):
+    at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=300).run()
+    if not apply_scenario(at, selection):
+        return None
+
+    clear_caches()
+    cold_s, cold_phases = timed_run(at, timer)
+    warm = [timed_run(at, timer) for _ in range(warm_runs)]
+    warm_s, warm_phases = min(warm, key=lambda run: run[0])
+
+    # Peak Python/numpy allocations of a cold rerun (traced separately: tracing slows the timings)
+    clear_caches()
+    tracemalloc.start()
+    at.run()
+    peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+
+    record = {'cold_s': cold_s, 'warm_s': warm_s, 'peak_mb': peak_mb}
+    record.update({f'cold_{phase}_s': value for phase, value in cold_phases.items()})
+    record.update({f'warm_{phase}_s': value for phase, value in warm_phases.items()})
+    return {key: round(value, 4) for key, value in record.items()}
+
+
+def run(pages, scenarios, warm_runs):
+    timer = PhaseTimer()
+    timer.install()
+    results = []
+    try:
+        for page in pages:
+            for name in scenarios:
+                record = bench_case(page, SCENARIOS[name], timer, warm_runs)
+                if record is not None:
+                    results.append({'page': page, 'scenario': name, **record})
+    finally:
+        timer.uninstall()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Rows of (page, scenario, metric, baseline, current, ratio, regressed)."""
+    previous = {(r['page'], r['scenario']): r for r in baseline['results']}
+    rows = []
+    for current in results:
+        before = previous.get((current['page'], current['scenario']))
+        if before is None:
+            continue
+        for metric in ('cold_s', 'warm_s'):
+            ratio = current[metric] / before[metric] if before[metric] else float('inf')
+            regressed = ratio > 1 + tolerance and current[metric] - before[metric] > NOISE_FLOOR_S
+            rows.append((current['page'], current['scenario'], metric, before[metric], current[metric], ratio, regressed))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless rerun latency of every page.")
+    parser.add_argument('--pages', nargs='*', help="page prefixes to run, e.g. Home 2 4 (default: all)")
+    parser.add_argument('--scenarios', nargs='*', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--warm-runs', type=int, default=3, help="warm reruns per case, the fastest is kept")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--baseline', help="results file of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    pages = discover_pages()
+    if args.pages:
+        pages = [p for p in pages if any(os.path.basename(p).startswith(prefix) for prefix in args.pages)]
+
+    results = run(pages, args.scenarios, args.warm_runs)
+
+    print(f"{'page':<38} {'scenario':<17} {'cold (s)':>9} {'warm (s)':>9} {'load':>7} {'filter':>7} {'figures':>8} {'peak MB':>8}")
+    for r in results:
+        print(f"{r['page']:<38} {r['scenario']:<17} {r['cold_s']:>9.3f} {r['warm_s']:>9.3f} "
+              f"{r['cold_loading_s']:>7.3f} {r['cold_filtering_s']:>7.3f} {r['cold_figures_s']:>8.3f} {r['peak_mb']:>8.1f}")
+
+    if args.json:
+        meta = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'streamlit': st.__version__,
+            'machine': platform.machine(), 'warm_runs': args.warm_runs,
+        }
+        with open(args.json, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(results, json.load(f), args.tolerance)
+        print()
+        print(f"{'page':<38} {'scenario':<17} {'metric':<7} {'baseline':>9} {'current':>9} {'ratio':>7}")
+        for page, scenario, metric, before, current, ratio, regressed in rows:
+            flag = '  REGRESSION' if regressed else ''
+            print(f"{page:<38} {scenario:<17} {metric:<7} {before:>9.3f} {current:>9.3f} {ratio:>6.2f}x{flag}")
+        sys.exit(1 if any(row[-1] for row in rows) else 0)
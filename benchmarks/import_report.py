@@ -0,0 +1,69 @@
+# benchmarks/import_report.py
+# Cold-start report: each script runs once in a fresh interpreter with `-X importtime`.
+# Columns: total process wall time, time spent importing, the script run itself, and the
+# time spent importing each heavy package (sum of its modules' self time, 0 = never imported).
+#
+#   python benchmarks/import_report.py            # table
+#   python benchmarks/import_report.py --eager    # same, with plotly / pycountry imported up front
+#   python benchmarks/import_report.py --csv      # machine-readable
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HEAVY_PACKAGES = ['plotly', 'narwhals', 'pycountry', 'pycountry_convert', 'utils']
+
+DRIVER = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+{eager}
+imported = time.perf_counter()
+at = AppTest.from_file({script!r}, default_timeout=300).run()
+print(json.dumps({{'imports_s': imported - started, 'run_s': time.perf_counter() - imported,
+                  'exceptions': len(at.exception)}}))
+"""
+EAGER_IMPORTS = "import plotly.express, plotly.graph_objects, pycountry, pycountry_convert"
+
+
+def parse_importtime(stderr):
+    """{package: seconds} from `-X importtime` output, summing the self time of the package's modules."""
+    totals = dict.fromkeys(HEAVY_PACKAGES, 0.0)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        if package in totals:
+            totals[package] += int(self_us) / 1e6
+    return totals
+
+
+def profile_script(script, eager=False):
+    code = DRIVER.format(root=ROOT, script=os.path.join(ROOT, script), eager=EAGER_IMPORTS if eager else '')
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, cwd=ROOT)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{script} failed:\n{proc.stderr[-2000:]}")
+    run = json.loads(proc.stdout.strip().splitlines()[-1])
+    imports = parse_importtime(proc.stderr)
+    row = {'script': script, 'process_s': wall, 'imports_s': run['imports_s'], 'run_s': run['run_s']}
+    row.update({f'{package}_s': imports[package] for package in HEAVY_PACKAGES})
+    return row
+
+
+if __name__ == "__main__":
+    scripts = ['Home.py'] + sorted(os.path.relpath(p, ROOT) for p in glob.glob(os.path.join(ROOT, 'pages', '*.py')))
+    report = pd.DataFrame([profile_script(script, eager='--eager' in sys.argv[1:]) for script in scripts])
+
+    if '--csv' in sys.argv[1:]:
+        print(report.to_csv(index=False), end='')
+    else:
+        print(report.round(3).to_string(index=False))
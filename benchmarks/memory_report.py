@@ -0,0 +1,26 @@
+# benchmarks/memory_report.py
+# Bytes per column of the loaded frames: plain CSV dtypes vs the compact layout.
+#
+#   python benchmarks/memory_report.py          # per-column table + totals
+#   python benchmarks/memory_report.py --csv    # machine-readable
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import utils
+
+
+if __name__ == "__main__":
+    before = utils.build_datasets(compact=False)
+    after = utils.compact_frames(tuple(df.copy() for df in before))
+    report = utils.memory_report(before, after)
+
+    if '--csv' in sys.argv[1:]:
+        print(report.to_csv(index=False), end='')
+    else:
+        print(report.to_string(index=False))
+        totals = report.groupby('dataset', sort=False)[['bytes_before', 'bytes_after']].sum()
+        totals.loc['TOTAL'] = totals.sum()
+        totals['saved_pct'] = (100 * (1 - totals['bytes_after'] / totals['bytes_before'])).round(1)
+        print()
+        print(totals.to_string())
@@ -0,0 +1,86 @@
+# benchmarks/shared_memory.py
+# Memory and start-up cost of N server processes holding the load_data frames (Linux, /proc):
+#   copied  - every process converts the snapshot into its own pandas memory (Arrow to_pandas)
+#   shared  - every process maps the published snapshot (DASHBOARD_SHARED_DATA=1, zero-copy)
+# private_kb is what the frames cost each worker on its own; shared_kb is held once for all.
+#
+#   python benchmarks/shared_memory.py            # 1, 2, 4 and 8 workers
+#   python benchmarks/shared_memory.py 2 16       # custom worker counts
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+import datalayer
+
+DEFAULT_WORKERS = (1, 2, 4, 8)
+
+WORKER = """
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+import datalayer
+
+def rollup():
+    with open('/proc/self/smaps_rollup') as f:
+        fields = dict(line.split(':', 1) for line in f if ':' in line and not line.startswith(' '))
+    return {{key: int(fields[key].split()[0]) for key in ('Private_Clean', 'Private_Dirty', 'Shared_Clean', 'Shared_Dirty')}}
+
+# Warm-up: the first Arrow -> pandas conversion imports a few MB of modules, not part of the frames
+datalayer.arrow_to_frame(datalayer.pa.table({{'a': datalayer.pa.array(['x']).dictionary_encode()}}))
+before = rollup()
+start = time.perf_counter()
+if {shared!r}:
+    frames = datalayer.DataStore(follow=True).refresh().frames
+else:
+    folder = os.path.join(datalayer.SNAPSHOT_DIR, {fingerprint!r})
+    frames = tuple(datalayer.read_arrow(os.path.join(folder, f"{{name}}.arrow")) for name in datalayer.SNAPSHOT_TABLES)
+load_s = time.perf_counter() - start
+print(json.dumps({{'load_s': load_s, 'before': before}}), flush=True)
+sys.stdin.readline() # parent reads /proc/<pid>/smaps_rollup while every worker is alive
+"""
+
+
+def smaps(pid):
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        fields = dict(line.split(':', 1) for line in f if ':' in line and not line.startswith(' '))
+    return {key: int(value.split()[0]) for key, value in fields.items() if value.strip().endswith('kB')}
+
+
+def run(n_workers, shared, fingerprint):
+    code = WORKER.format(root=ROOT, shared=shared, fingerprint=fingerprint)
+    workers = [subprocess.Popen([sys.executable, '-c', code], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True, cwd=ROOT) for _ in range(n_workers)]
+    try:
+        reports = [json.loads(worker.stdout.readline()) for worker in workers]
+        after = [smaps(worker.pid) for worker in workers]
+    finally:
+        for worker in workers:
+            worker.communicate('\n')
+
+    private_kb = [a['Private_Clean'] + a['Private_Dirty'] - r['before']['Private_Clean'] - r['before']['Private_Dirty']
+                  for r, a in zip(reports, after)]
+    shared_kb = [a['Shared_Clean'] + a['Shared_Dirty'] - r['before']['Shared_Clean'] - r['before']['Shared_Dirty']
+                 for r, a in zip(reports, after)]
+    return {
+        'mode': 'shared' if shared else 'copied',
+        'workers': n_workers,
+        'load_ms': 1000 * max(r['load_s'] for r in reports),
+        'private_kb': sum(private_kb) / n_workers,
+        'total_private_kb': sum(private_kb),
+        'shared_kb': max(shared_kb),
+    }
+
+
+if __name__ == "__main__":
+    counts = [int(x) for x in sys.argv[1:]] or DEFAULT_WORKERS
+    folder = datalayer.build_snapshot() # also publishes it for the shared readers
+    fingerprint = os.path.basename(folder)
+
+    print(f"{'mode':<7} {'workers':>7} {'load (ms)':>10} {'private/worker (kB)':>20} {'total private (kB)':>19} {'shared (kB)':>12}")
+    for n_workers in counts:
+        for shared in (False, True):
+            r = run(n_workers, shared, fingerprint)
+            print(f"{r['mode']:<7} {r['workers']:>7} {r['load_ms']:>10.1f} {r['private_kb']:>20.0f} "
+                  f"{r['total_private_kb']:>19.0f} {r['shared_kb']:>12.0f}")
@@ -0,0 +1,976 @@
+# datalayer.py
+# The data layer, without Streamlit: CSV parsing and cleaning, the Arrow snapshots and the
+# versioned DataStore, the country resolver, and the structures built on the loaded frames
+# (discipline bridge, filter indexes, medal fact table, schedule intervals, bounded result cache).
+# utils.py shares them across sessions through its Streamlit caches; analytics.py, the
+# benchmarks and batch jobs use them directly.
+import pandas as pd
+import numpy as np
+import os
+import hashlib
+import json
+import shutil
+import tempfile
+import time
+import functools
+import threading
+import importlib
+import pyarrow as pa
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime
+
+class LazyModule:
+    """
+    Stand-in for a heavy module, imported on first attribute access.
+    Pages use it for plotly (loaded with the first chart, after the KPIs are on screen);
+    utils uses it for the country libraries, only needed when the resolver is (re)built.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name) # import lock: safe across sessions
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyModule {self._name} ({state})>"
+
+pycountry = LazyModule('pycountry')
+pc = LazyModule('pycountry_convert')
+
+# --- 1. HELPER FUNCTIONS ---
+def get_continent(country_name):
+    entry = country_lookup().get(country_name)
+    if entry is not None:
+        return entry['continent']
+    # Names outside nocs.csv: best effort straight from the name
+    try:
+        country_alpha2 = pc.country_name_to_country_alpha2(country_name)
+        continent_code = pc.country_alpha2_to_continent_code(country_alpha2)
+        return pc.convert_continent_code_to_continent_name(continent_code)
+    except:
+        return "Other"
+
+# Ages are computed against this date. Defaults to today; set e.g.
+# AGE_REFERENCE_DATE=2024-07-26 to get ages at the opening ceremony.
+def age_reference_date():
+    ref = os.environ.get('AGE_REFERENCE_DATE')
+    return date.fromisoformat(ref) if ref else date.today()
+
+def calculate_age(birth_date, reference_date=None):
+    if pd.isnull(birth_date): return None
+    today = reference_date or age_reference_date()
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+def calculate_ages(birth_dates, reference_date=None):
+    """
+    Vectorized calculate_age() over a datetime Series (NaT -> NaN).
+    Compares month*100+day so the birthday check is one array operation.
+    """
+    today = reference_date or age_reference_date()
+    birth_dates = pd.to_datetime(birth_dates, errors='coerce')
+    birthday_not_reached = (birth_dates.dt.month * 100 + birth_dates.dt.day) > (today.month * 100 + today.day)
+    ages = today.year - birth_dates.dt.year - birthday_not_reached.astype(int)
+    return ages.astype(float).where(birth_dates.notna())
+
+def map_continents(*country_columns):
+    """
+    Resolves each DISTINCT country once with get_continent() and maps the result
+    back onto every given column (e.g. athletes and medallists share one lookup).
+    """
+    codes, countries = pd.factorize(pd.concat(country_columns, ignore_index=True))
+    # Missing countries get code -1, i.e. the trailing "Other"
+    continents = np.array([get_continent(country) for country in countries] + ["Other"], dtype=object)
+    resolved = continents[codes]
+
+    results, offset = [], 0
+    for col in country_columns:
+        results.append(pd.Series(resolved[offset:offset + len(col)], index=col.index, name='Continent'))
+        offset += len(col)
+    return results
+
+# --- 2. DATA LOADING ---
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Cleaned frames are persisted as Arrow IPC files under data/.snapshot/<fingerprint>/
+# so a cold start can memory-map them instead of re-parsing and re-deriving the CSVs.
+# Bump SNAPSHOT_VERSION whenever build_datasets() changes what it produces.
+SNAPSHOT_DIR = os.path.join(DATA_DIR, '.snapshot')
+SNAPSHOT_VERSION = 4
+SNAPSHOT_SOURCES = ('athletes.csv', 'medallists.csv', 'nocs.csv', 'events.csv')
+SNAPSHOT_TABLES = ('athletes', 'medallists', 'nocs', 'events')
+# Inputs of each loaded table: a changed input rebuilds only the tables listing it
+# (a new medallists.csv never re-parses athletes or recomputes ages)
+AGE_REFERENCE = 'age_reference_date'
+TABLE_SOURCES = {
+    'athletes': ('athletes.csv', AGE_REFERENCE),
+    'medallists': ('medallists.csv', 'athletes.csv', AGE_REFERENCE),
+    'nocs': ('nocs.csv',),
+    'events': ('events.csv',),
+}
+
+def clean_athletes(athletes, reference_date):
+    # 1. Clean Athletes Data
+    # Clean disciplines string: "['Swimming']" -> "Swimming"
+    athletes['disciplines'] = athletes['disciplines'].astype(str).str.replace(r"[\[\]']", "", regex=True)
+    
+    # Calculate Age
+    athletes['birth_date'] = pd.to_datetime(athletes['birth_date'], errors='coerce')
+    athletes['Age'] = calculate_ages(athletes['birth_date'], reference_date)
+    athletes['Continent'] = map_continents(athletes['country'])[0]
+    return athletes
+
+def clean_medallists(medallists, athletes):
+    # 2. MERGE: Join Athletes info (Age, Gender) into Medallists
+    # We drop 'gender' from medallists first so we can replace it with the clean 'gender' from athletes
+    medallists = medallists.drop(columns=['gender'], errors='ignore')
+    
+    medallists = medallists.merge(
+        athletes[['code', 'Age', 'gender']], # Select only what we need to add/fix
+        left_on='code_athlete',              # Key in Medallists
+        right_on='code',                     # Key in Athletes
+        how='left'
+    )
+    
+    # 3. Final Polish: Continent
+    medallists['Continent'] = map_continents(medallists['country'])[0]
+    return medallists
+
+def build_tables(names, data_dir=DATA_DIR, reference_date=None, previous=None):
+    """
+    Cleaned (not yet compacted) tables `names`, as {name: DataFrame}. Tables they read
+    but which are not rebuilt come from `previous`, e.g. build_tables(['medallists'],
+    previous=loaded) merges the new medallists with the already loaded athletes.
+    """
+    reference_date = reference_date or age_reference_date()
+    tables = dict(previous or {})
+    for name in SNAPSHOT_TABLES:
+        if name not in names:
+            continue
+        raw = pd.read_csv(os.path.join(data_dir, f"{name}.csv"))
+        if name == 'athletes':
+            raw = clean_athletes(raw, reference_date)
+        elif name == 'medallists':
+            raw = clean_medallists(raw, tables['athletes'])
+        tables[name] = raw
+    return tables
+
+def build_datasets(data_dir=DATA_DIR, reference_date=None, compact=True):
+    tables = build_tables(SNAPSHOT_TABLES, data_dir, reference_date)
+    frames = tuple(tables[name] for name in SNAPSHOT_TABLES)
+    return compact_frames(frames) if compact else frames
+
+# Columns that share ONE category dictionary across frames (same codes everywhere)
+SHARED_CATEGORIES = {
+    'country': (('athletes', 'country'), ('medallists', 'country')),
+    'country_code': (('athletes', 'country_code'), ('medallists', 'country_code')),
+    'Continent': (('athletes', 'Continent'), ('medallists', 'Continent')),
+    'gender': (('athletes', 'gender'), ('medallists', 'gender')),
+    'sport': (('medallists', 'discipline'),), # athletes' combined 'disciplines' go through the discipline bridge
+    'medal_type': (('medallists', 'medal_type'),),
+    'event': (('medallists', 'event'),),
+}
+SMALL_INT_COLUMNS = {'Age': 'Int8'}
+# Any other text column repeating values this much also becomes categorical
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+def compact_numeric(col):
+    """int64 -> smallest int; integral floats (ints with NaN) -> smallest nullable Int; other floats -> float32."""
+    if pd.api.types.is_bool_dtype(col) or not pd.api.types.is_numeric_dtype(col):
+        return col
+    if pd.api.types.is_integer_dtype(col):
+        return pd.to_numeric(col, downcast='integer')
+    values = col.dropna()
+    if (values == values.round()).all():
+        return pd.to_numeric(col.astype('Int64'), downcast='integer')
+    return col.astype('float32')
+
+def compact_frames(frames):
+    """
+    Compact in-memory layout for the loaded frames: categorical dtypes (one shared
+    dictionary per SHARED_CATEGORIES group), downcast numerics, nullable small ints.
+    """
+    frames = dict(zip(SNAPSHOT_TABLES, frames))
+    for members in SHARED_CATEGORIES.values():
+        members = [(name, col) for name, col in members if col in frames[name]]
+        values = pd.concat([frames[name][col] for name, col in members], ignore_index=True)
+        dtype = pd.CategoricalDtype(sorted(values.dropna().unique()))
+        for name, col in members:
+            frames[name][col] = frames[name][col].astype(dtype)
+
+    for df in (frames['athletes'], frames['medallists']):
+        for col in df.columns:
+            if col in SMALL_INT_COLUMNS:
+                df[col] = df[col].astype(SMALL_INT_COLUMNS[col])
+            elif pd.api.types.is_string_dtype(df[col]) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                if df[col].nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(df):
+                    df[col] = df[col].astype('category')
+            else:
+                df[col] = compact_numeric(df[col])
+    return tuple(frames[name] for name in SNAPSHOT_TABLES)
+
+def memory_report(before, after):
+    """Bytes per column (deep) for two versions of the same frames, e.g. build_datasets(compact=False) vs load_data()."""
+    rows = []
+    for name, df_before, df_after in zip(SNAPSHOT_TABLES, before, after):
+        usage_before = df_before.memory_usage(index=False, deep=True)
+        usage_after = df_after.memory_usage(index=False, deep=True)
+        for col in df_before.columns:
+            rows.append({
+                'dataset': name,
+                'column': col,
+                'dtype_before': str(df_before[col].dtype),
+                'bytes_before': int(usage_before[col]),
+                'dtype_after': str(df_after[col].dtype) if col in df_after else None,
+                'bytes_after': int(usage_after.get(col, 0)),
+            })
+    report = pd.DataFrame(rows)
+    report['saved_pct'] = (100 * (1 - report['bytes_after'] / report['bytes_before'])).round(1)
+    return report
+
+def write_arrow(df, path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def arrow_to_frame(table):
+    """
+    Arrow table -> DataFrame that stays on the Arrow buffers wherever pandas allows it:
+    numeric and string columns, and the codes of categoricals without missing values.
+    Read from a memory-mapped file, those pages are shared by every process mapping it.
+    """
+    df = table.to_pandas(split_blocks=True)
+    for field, column in zip(table.schema, table.columns):
+        if pa.types.is_dictionary(field.type) and column.num_chunks == 1 and column.null_count == 0:
+            indices = column.chunk(0).indices
+            codes = np.frombuffer(indices.buffers()[1], dtype=indices.type.to_pandas_dtype(), count=len(indices),
+                                  offset=indices.offset * indices.type.bit_width // 8)
+            categorical = pd.Categorical.from_codes(codes, dtype=df[field.name].dtype, validate=False)
+            df[field.name] = pd.Series(categorical, index=df.index, copy=False)
+    return df
+
+def read_arrow(path, zero_copy=False):
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+        return arrow_to_frame(table) if zero_copy else table.to_pandas()
+
+def is_fingerprint(name):
+    return len(name) == 16 and all(c in '0123456789abcdef' for c in name)
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def combine_digests(digests, names):
+    key = '|'.join(f"{name}={digests[name]}" for name in names)
+    return hashlib.sha1(f"v{SNAPSHOT_VERSION}|{key}".encode()).hexdigest()[:16]
+
+class SourceTracker:
+    """
+    Content digest of every source file, re-hashed only when its (mtime, size) moves:
+    a poll is a few os.stat calls, and a touched but identical file changes nothing.
+    The age reference date is tracked as one more input, since Age is baked into the tables.
+    """
+    def __init__(self, data_dir=DATA_DIR, sources=SNAPSHOT_SOURCES):
+        self.data_dir = data_dir
+        self.sources = sources
+        self.seen = {}  # name -> ((mtime_ns, size), digest)
+
+    def poll(self):
+        digests = {}
+        for name in self.sources:
+            path = os.path.join(self.data_dir, name)
+            stat = os.stat(path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            entry = self.seen.get(name)
+            if entry is None or entry[0] != stamp:
+                entry = self.seen[name] = (stamp, file_digest(path))
+            digests[name] = entry[1]
+        digests[AGE_REFERENCE] = age_reference_date().isoformat()
+        return digests
+
+def source_fingerprint(data_dir=DATA_DIR, sources=SNAPSHOT_SOURCES, digests=None):
+    """
+    Hashes the content of every source CSV (plus the snapshot version and the
+    age reference date, since Age is baked into the snapshot).
+    Any edit to an input file gives a new fingerprint, i.e. a new snapshot.
+    """
+    digests = digests or SourceTracker(data_dir, sources).poll()
+    return combine_digests(digests, sources + (AGE_REFERENCE,))
+
+def write_snapshot(frames, fingerprint, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Writes the cleaned frames as uncompressed Arrow IPC files (memory-mappable).
+    Files go to a temporary folder which is renamed into place at the end,
+    so a reader never sees a half-written snapshot. Older snapshots are pruned.
+    """
+    final_dir = os.path.join(snapshot_dir, fingerprint)
+    if os.path.isdir(final_dir):
+        return final_dir
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{fingerprint}-", dir=snapshot_dir)
+    try:
+        for name, df in zip(SNAPSHOT_TABLES, frames):
+            write_arrow(df, os.path.join(tmp_dir, f"{name}.arrow"))
+        os.rename(tmp_dir, final_dir)
+    except OSError:
+        # Another process won the race (or the folder is read-only): keep theirs
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(final_dir):
+            raise
+
+    for entry in os.listdir(snapshot_dir):
+        if entry != fingerprint and is_fingerprint(entry):
+            shutil.rmtree(os.path.join(snapshot_dir, entry), ignore_errors=True)
+    return final_dir
+
+def read_snapshot(fingerprint, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Memory-maps a snapshot back into DataFrames (zero-copy, see arrow_to_frame). Returns None
+    if it does not exist. The mapped pages are read-only: frames built on them must not be modified.
+    """
+    folder = os.path.join(snapshot_dir, fingerprint)
+    if not os.path.isdir(folder):
+        return None
+
+    return tuple(read_arrow(os.path.join(folder, f"{name}.arrow"), zero_copy=True) for name in SNAPSHOT_TABLES)
+
+def build_snapshot(data_dir=DATA_DIR, snapshot_dir=SNAPSHOT_DIR, force=False):
+    """Build step: (re)creates the snapshot for the current CSVs and publishes it. Returns its folder."""
+    digests = SourceTracker(data_dir).poll()
+    fingerprint = source_fingerprint(digests=digests)
+    folder = os.path.join(snapshot_dir, fingerprint)
+    if force:
+        shutil.rmtree(folder, ignore_errors=True)
+    if not os.path.isdir(folder):
+        folder = write_snapshot(build_datasets(data_dir), fingerprint, snapshot_dir)
+    publish_snapshot(fingerprint, digests, snapshot_dir)
+    return folder
+
+def watch_sources(interval=5.0, data_dir=DATA_DIR, snapshot_dir=SNAPSHOT_DIR):
+    """Builder process loop: publishes a new snapshot whenever a CSV changes (incremental rebuild)."""
+    store = DataStore(data_dir, snapshot_dir)
+    published = None
+    while True:
+        version = store.refresh()
+        if version.fingerprint != published:
+            write_snapshot(version.frames, version.fingerprint, snapshot_dir)
+            publish_snapshot(version.fingerprint, version.digests, snapshot_dir)
+            published = version.fingerprint
+            print(f"{datetime.now():%H:%M:%S} published {published} (rebuilt: {', '.join(store.rebuilt) or 'none'})", flush=True)
+        time.sleep(interval)
+
+# Several server processes: one builder process parses the CSVs and publishes each snapshot
+# (python utils.py --watch); servers started with DASHBOARD_SHARED_DATA=1 follow the published
+# manifest and only memory-map the snapshot, so every worker shares the same physical pages.
+SHARED_DATA_ENV = 'DASHBOARD_SHARED_DATA'
+MANIFEST_FILE = 'CURRENT.json'
+
+def publish_snapshot(fingerprint, digests, snapshot_dir=SNAPSHOT_DIR):
+    """Points the readers at a written snapshot (the manifest is replaced atomically)."""
+    path = os.path.join(snapshot_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'fingerprint': fingerprint, 'digests': digests}, f)
+    os.replace(tmp_path, path)
+
+# One immutable version of the loaded data: the frames (SNAPSHOT_TABLES order), the source
+# digests they were built from and a version per table (changes only when its inputs do)
+DataVersion = namedtuple('DataVersion', ['fingerprint', 'frames', 'digests', 'tables'])
+
+def make_version(fingerprint, frames, digests):
+    tables = {name: combine_digests(digests, TABLE_SOURCES[name]) for name in SNAPSHOT_TABLES}
+    return DataVersion(fingerprint, frames, digests, tables)
+
+class DataStore:
+    """
+    The loaded frames shared by every session. refresh() polls the sources (cheap, every
+    rerun); when files changed it rebuilds only the tables listing them in TABLE_SOURCES,
+    reusing the others as they are, and swaps the new DataVersion in with one assignment:
+    a reader gets the old or the new version, never a mix.
+    With follow=True (SHARED_DATA_ENV) it maps the builder's published snapshots instead,
+    and only parses the CSVs itself while nothing has been published yet.
+    """
+    def __init__(self, data_dir=DATA_DIR, snapshot_dir=SNAPSHOT_DIR, follow=False):
+        self.data_dir = data_dir
+        self.snapshot_dir = snapshot_dir
+        self.follow = follow
+        self.manifest_stamp = None
+        self.tracker = SourceTracker(data_dir)
+        self.current = None
+        self.rebuilt = ()   # tables rebuilt by the last change
+        self.failed = None  # fingerprint of a drop that did not parse, retried once the files move again
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        if self.follow:
+            version = self.follow_manifest()
+            if version is not None:
+                return version
+
+        digests = self.tracker.poll()
+        fingerprint = source_fingerprint(digests=digests)
+        current = self.current
+        if current is not None and fingerprint in (current.fingerprint, self.failed):
+            return current
+
+        with self.lock:
+            if self.current is not None and self.current.fingerprint == fingerprint:
+                return self.current
+            try:
+                frames, rebuilt = self.build(fingerprint, digests)
+            except (OSError, ValueError, KeyError): # ParserError is a ValueError
+                if self.current is None:
+                    raise
+                self.failed = fingerprint # e.g. a file caught mid-copy: keep serving the last good version
+                return self.current
+            self.current = make_version(fingerprint, frames, digests)
+            self.rebuilt = rebuilt
+            return self.current
+
+    def follow_manifest(self):
+        """Latest published version (one os.stat when unchanged); None if nothing was published yet."""
+        path = os.path.join(self.snapshot_dir, MANIFEST_FILE)
+        try:
+            stamp = os.stat(path).st_mtime_ns
+            if self.current is not None and stamp == self.manifest_stamp:
+                return self.current
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return self.current
+
+        with self.lock:
+            if self.current is None or self.current.fingerprint != manifest['fingerprint']:
+                try:
+                    frames = read_snapshot(manifest['fingerprint'], self.snapshot_dir)
+                except (OSError, pa.ArrowException):
+                    frames = None
+                if frames is None:
+                    return self.current # pruned by a newer build: its manifest is about to replace this one
+                self.current = make_version(manifest['fingerprint'], frames, manifest['digests'])
+                self.rebuilt = ()
+            self.manifest_stamp = stamp
+            return self.current
+
+    def build(self, fingerprint, digests):
+        """(frames, names of the rebuilt tables) for a new fingerprint."""
+        # 1. Fast path: snapshot for these exact CSVs already exists
+        frames = read_snapshot(fingerprint, self.snapshot_dir)
+        if frames is not None:
+            return frames, ()
+
+        # 2. Slow path: parse the changed CSVs (all of them on a cold start), then persist the result
+        previous = {}
+        stale = SNAPSHOT_TABLES
+        if self.current is not None:
+            changed = {name for name, digest in digests.items() if self.current.digests.get(name) != digest}
+            stale = tuple(name for name in SNAPSHOT_TABLES if changed & set(TABLE_SOURCES[name]))
+            # Shallow copies: compacting re-unifies shared categories without touching the live frames
+            previous = {name: df.copy(deep=False) for name, df in zip(SNAPSHOT_TABLES, self.current.frames)}
+        reference_date = date.fromisoformat(digests[AGE_REFERENCE])
+        tables = build_tables(stale, self.data_dir, reference_date, previous)
+        frames = compact_frames(tuple(tables[name] for name in SNAPSHOT_TABLES))
+        try:
+            write_snapshot(frames, fingerprint, self.snapshot_dir)
+        except (OSError, pa.ArrowException):
+            pass # A missing snapshot only costs speed, never correctness
+        return frames, stale
+
+# --- 3. COUNTRY RESOLVER ---
+# Olympic NOCs that pycountry cannot match exactly (or that fuzzy search gets wrong,
+# e.g. "Korea" -> PRK, "Kosovo" -> SRB). None = not a country (neutral/historic teams).
+NOC_ISO3_OVERRIDES = {
+    'GBR': 'GBR', 'KOR': 'KOR', 'TPE': 'TWN', 'HKG': 'HKG', 'KOS': 'XKX',
+    'COD': 'COD', 'ISV': 'VIR', 'VIN': 'VCT', 'PLE': 'PSE',
+    'AIN': None, 'EOR': None, 'ROT': None, 'IOA': None, 'IOP': None, 'OAR': None,
+    'ROC': None, 'BOC': None, 'COR': None, 'EUN': None, 'CIS': None, 'URS': None,
+    'GDR': None, 'TCH': None, 'YUG': None, 'SCG': None, 'AHO': None,
+}
+# ISO3 codes pycountry_convert has no continent for
+ISO3_CONTINENT_OVERRIDES = {'XKX': 'Europe', 'TLS': 'Asia'}
+
+def resolve_iso3(*names):
+    """Exact pycountry lookup (name, official name, codes) on each candidate name."""
+    for name in names:
+        try:
+            return pycountry.countries.lookup(name).alpha_3
+        except LookupError:
+            continue
+    return None
+
+def continent_from_iso3(iso3):
+    if iso3 in ISO3_CONTINENT_OVERRIDES:
+        return ISO3_CONTINENT_OVERRIDES[iso3]
+    try:
+        country_alpha2 = pycountry.countries.get(alpha_3=iso3).alpha_2
+        return pc.convert_continent_code_to_continent_name(pc.country_alpha2_to_continent_code(country_alpha2))
+    except (AttributeError, KeyError):
+        return "Other"
+
+def build_country_index(nocs):
+    """
+    One row per NOC: noc, country, country_long, iso3, continent, display_name, resolved.
+    'resolved' is False only for names that neither the overrides nor pycountry could match.
+    """
+    index = nocs[['code', 'country', 'country_long', 'note']].rename(columns={'code': 'noc'}).copy()
+    iso3, resolved = [], []
+    for row in index.itertuples():
+        if row.noc in NOC_ISO3_OVERRIDES:
+            iso3.append(NOC_ISO3_OVERRIDES[row.noc])
+            resolved.append(True)
+        else:
+            iso3.append(resolve_iso3(row.country, row.country_long))
+            resolved.append(iso3[-1] is not None)
+    index['iso3'] = iso3
+    index['continent'] = [continent_from_iso3(code) if code else "Other" for code in iso3]
+    index['display_name'] = index['country']
+    index['resolved'] = resolved
+    return index
+
+def index_fingerprint(data_dir=DATA_DIR):
+    # The overrides are part of the key: editing them rebuilds the persisted index
+    digest = hashlib.sha1(repr((NOC_ISO3_OVERRIDES, ISO3_CONTINENT_OVERRIDES)).encode())
+    with open(os.path.join(data_dir, 'nocs.csv'), 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+@functools.cache
+def load_country_index(data_dir=DATA_DIR, snapshot_dir=SNAPSHOT_DIR):
+    """Country index, built once per nocs.csv version and persisted next to the snapshot."""
+    path = os.path.join(snapshot_dir, f"countries-{index_fingerprint(data_dir)}.arrow")
+    if os.path.exists(path):
+        return read_arrow(path)
+
+    index = build_country_index(pd.read_csv(os.path.join(data_dir, 'nocs.csv')))
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        write_arrow(index, tmp_path)
+        os.replace(tmp_path, path)
+        for entry in os.listdir(snapshot_dir):
+            if entry.startswith('countries-') and entry != os.path.basename(path):
+                os.remove(os.path.join(snapshot_dir, entry))
+    except OSError:
+        pass
+    return index
+
+@functools.cache
+def country_lookup():
+    """
+    O(1) lookup: Olympic name, long name or NOC code -> {'noc', 'iso3', 'continent', 'display_name'}.
+    Current NOCs ('P') win over historic ones sharing a name (e.g. KOR vs COR for "Korea").
+    """
+    index = load_country_index()
+    index = index.sort_values('note', key=lambda note: note.eq('P'), kind='stable')
+    lookup = {}
+    for row in index.to_dict('records'):
+        entry = {k: (None if pd.isna(row[k]) else row[k]) for k in ('noc', 'iso3', 'continent', 'display_name')}
+        for key in (row['country_long'], row['country'], row['noc']):
+            lookup[key] = entry
+    return lookup
+
+def unresolved_countries():
+    """Country names from nocs.csv that could not be mapped to an ISO3 code."""
+    index = load_country_index()
+    return index.loc[~index['resolved'], 'country'].tolist()
+
+def get_iso3_code(country_name):
+    entry = country_lookup().get(country_name)
+    return entry['iso3'] if entry is not None else None
+
+# --- 4. DISCIPLINE BRIDGE ---
+# Athletes may list several disciplines ("Cycling Road, Cycling Track"). The sport facet and
+# filter use a bridge with one row per (athlete, discipline) instead of the combined string.
+def build_athlete_disciplines(athletes_df):
+    """
+    Bridge: 'row' (int32 position in athletes_df) and 'discipline' (categorical: integer codes
+    into the sorted discipline names), sorted by row. Each distinct combined value is split once.
+    """
+    combo_codes, combos = pd.factorize(athletes_df['disciplines'])
+    parts = [sorted({name.strip() for name in str(combo).split(',') if name.strip()}) for combo in combos]
+    members = pd.DataFrame({
+        'combo': np.repeat(np.arange(len(parts)), [len(part) for part in parts]),
+        'discipline': [name for part in parts for name in part],
+    })
+    rows = pd.DataFrame({'row': np.arange(len(athletes_df), dtype='int32'), 'combo': combo_codes})
+    bridge = rows.merge(members, on='combo')[['row', 'discipline']].sort_values(['row', 'discipline'], kind='stable')
+    bridge['discipline'] = bridge['discipline'].astype(pd.CategoricalDtype(sorted(members['discipline'].unique())))
+    return bridge.reset_index(drop=True)
+
+# --- 5. FILTER ENGINE ---
+# Which column each sidebar filter applies to, per dataset.
+# A new dataset only needs an entry here to go through the same engine.
+FILTER_COLUMNS = {
+    'athletes': {'continent': 'Continent', 'country': 'country', 'gender': 'gender', 'age': 'Age'},
+    'medallists': {'continent': 'Continent', 'country': 'country', 'sport': 'discipline', 'gender': 'gender', 'age': 'Age'},
+    'medal_facts': {'continent': 'Continent', 'country': 'country', 'sport': 'discipline', 'gender': 'gender', 'age': 'Age'},
+    'schedule': {'sport': 'discipline', 'venue': 'venue'},
+}
+RANGE_FILTERS = ('age',)
+
+def filter_key(filters, ignore=()):
+    """Canonical hash of a filter dict: list order and ignored keys do not matter."""
+    canonical = {
+        key: (list(value) if key in RANGE_FILTERS else sorted(map(str, value)))
+        for key, value in filters.items() if key not in ignore
+    }
+    return hashlib.sha1(json.dumps(canonical, sort_keys=True, default=str).encode()).hexdigest()
+
+class FilterIndex:
+    """
+    Precomputed row index over one DataFrame.
+    - categorical filters: integer codes + a sorted array of row positions per value
+    - range filters: row positions sorted by value (a range becomes two searchsorted)
+    - bridged filters: postings from a (row, value) bridge, a row matches if any of its values does
+    A selection is the intersection of the per-filter position sets; results are
+    memoized by filter_key().
+    """
+    def __init__(self, df, columns, cache_size=256, bridges=None):
+        self.n_rows = len(df)
+        self.postings = {}  # filter -> {value: sorted positions}
+        self.bridged = set(bridges or ())
+        self.has_missing = {}
+        self.ranges = {}    # filter -> (sorted values, positions in that order)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock() # sessions run in threads and share the index
+
+        for key, column in columns.items():
+            values = df[column]
+            self.has_missing[key] = bool(values.isna().any())
+            if key in RANGE_FILTERS:
+                valid = np.flatnonzero(values.notna().to_numpy())
+                numbers = values.to_numpy(dtype=float, na_value=np.nan)[valid]
+                order = np.argsort(numbers, kind='stable')
+                self.ranges[key] = (numbers[order], valid[order])
+            else:
+                self.postings[key] = self.build_postings(values, np.arange(self.n_rows))
+
+        for key, bridge in (bridges or {}).items():
+            rows = bridge['row'].to_numpy()
+            self.has_missing[key] = len(np.unique(rows)) < self.n_rows
+            self.postings[key] = self.build_postings(bridge.iloc[:, 1], rows)
+
+    @staticmethod
+    def build_postings(values, rows):
+        """{value: sorted row positions} from parallel `values` / `rows` (rows ascending)."""
+        codes, uniques = pd.factorize(values)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        positions = rows[order]
+        return {value: positions[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques)}
+
+    def clause(self, key, value):
+        """Sorted row positions matching one filter, or None if it keeps every row."""
+        if key in self.ranges:
+            numbers, positions = self.ranges[key]
+            low, high = value
+            if not self.has_missing[key] and (len(numbers) == 0 or (low <= numbers[0] and high >= numbers[-1])):
+                return None
+            start = np.searchsorted(numbers, low, side='left')
+            stop = np.searchsorted(numbers, high, side='right')
+            return np.sort(positions[start:stop])
+
+        postings = self.postings[key]
+        selected = set(value)
+        if not self.has_missing[key] and selected.issuperset(postings):
+            return None
+        parts = [postings[v] for v in selected if v in postings]
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+        # A bridged row can sit in several postings (an athlete of two selected sports)
+        return np.unique(np.concatenate(parts)) if key in self.bridged else np.sort(np.concatenate(parts))
+
+    def select(self, filters, ignore=()):
+        """Row positions (sorted) matching every filter not listed in `ignore`."""
+        key = filter_key(filters, ignore)
+        with self.lock:
+            rows = self.cache.get(key)
+            if rows is not None:
+                self.cache.move_to_end(key)
+                return rows
+
+        clauses = [
+            self.clause(name, value) for name, value in filters.items()
+            if name not in ignore and (name in self.postings or name in self.ranges)
+        ]
+        clauses = sorted((c for c in clauses if c is not None), key=len)
+        if not clauses:
+            rows = np.arange(self.n_rows)
+        else:
+            rows = clauses[0]
+            for other in clauses[1:]:
+                if len(rows) == 0:
+                    break
+                rows = np.intersect1d(rows, other, assume_unique=True)
+
+        with self.lock:
+            self.cache[key] = rows
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return rows
+
+# --- 6. MEDAL FACT TABLE ---
+MEDAL_KEY = ['country', 'discipline', 'event', 'medal_type']
+MEDAL_TYPES = ['Gold Medal', 'Silver Medal', 'Bronze Medal']
+# A medal is one (discipline, event, medal_type) won by one holder: the team (code_team) in
+# team events, the athlete otherwise. Two bronzes of the same country stay two medals.
+MEDAL_IDENTITY = ['discipline', 'event', 'medal_type']
+
+def medal_holders(medallists):
+    team = medallists['code_team'].astype(object)
+    return team.where(team.notna(), medallists['code_athlete'].astype(str))
+
+def build_medal_facts(medallists):
+    """
+    Deduplicated medal fact table: one row per (medal, gender, Age).
+    A medal is one MEDAL_IDENTITY + holder (same rule as count_medals), so a team
+    medal keeps one row per distinct gender/age of its members instead of one per
+    athlete. Rolling up = counting DISTINCT medal_id among the filtered rows:
+    a team medal counts once as soon as one member matches the filters.
+    """
+    keys = [medallists[col] for col in MEDAL_IDENTITY] + [medal_holders(medallists)]
+    facts = medallists[['Continent'] + MEDAL_KEY + ['gender', 'Age']].copy()
+    facts.insert(0, 'medal_id', medallists.groupby(keys, observed=True, sort=False).ngroup().to_numpy(dtype='int32'))
+    return facts.drop_duplicates(subset=['medal_id', 'gender', 'Age']).reset_index(drop=True)
+
+# --- 7. SCHEDULE ---
+# All session times are shown in Games time (Paris), whatever offset the CSV uses
+SCHEDULE_TIMEZONE = 'Europe/Paris'
+SCHEDULE_CATEGORIES = ['status', 'discipline', 'discipline_code', 'event', 'phase', 'gender', 'event_type',
+                       'venue', 'venue_code', 'location_description', 'location_code']
+
+def read_schedule(data_dir=DATA_DIR):
+    """Typed schedule: tz-aware start/end (Paris time), categorical labels, sorted by start time."""
+    file_path = os.path.join(data_dir, 'schedule.csv')
+    if not os.path.exists(file_path):
+        file_path = os.path.join(data_dir, 'schedules.csv')
+    schedule = pd.read_csv(file_path)
+
+    for col in ('start_date', 'end_date'):
+        schedule[col] = pd.to_datetime(schedule[col], errors='coerce', utc=True).dt.tz_convert(SCHEDULE_TIMEZONE)
+    schedule = schedule.dropna(subset=['start_date', 'end_date'])
+    # Zero-length sessions get 30 minutes so they stay visible on the timeline
+    schedule.loc[schedule['start_date'] == schedule['end_date'], 'end_date'] += pd.Timedelta(minutes=30)
+    schedule['Day'] = schedule['start_date'].dt.date
+
+    for col in SCHEDULE_CATEGORIES:
+        schedule[col] = schedule[col].astype('category')
+    return schedule.sort_values('start_date', kind='stable').reset_index(drop=True)
+
+# --- 8. RESULT CACHE ---
+# Bounded LRU shared by the figure cache (utils.cached_figure) and the analytics query cache.
+FIGURE_CACHE_SIZE = 64
+
+def figure_key(chart, filters=None, filter_keys=None, **params):
+    """
+    Cache key of one chart: its id, the sidebar filters it depends on (all of `filters`,
+    or only `filter_keys`) and any local widget values passed as keyword arguments.
+    """
+    subset = {
+        key: value for key, value in (filters or {}).items()
+        if filter_keys is None or key in filter_keys
+    }
+    return f"{chart}:{filter_key(subset)}:{json.dumps(params, sort_keys=True, default=str)}"
+
+class FigureCache:
+    """Bounded LRU of built figures keyed by figure_key(), with hit/miss counters."""
+    def __init__(self, max_entries=FIGURE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+        figure = build()
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = figure
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return figure
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+            'evictions': self.evictions, 'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+# --- 9. SCHEDULE INTERVALS ---
+# Sweep line over the schedule: each session is a +1 event at its start and a -1 event at its
+# end. One sort of the 2n events (O(n log n)) gives the number of open sessions per venue or
+# discipline at every instant; peaks, idle gaps, overlaps and the heatmap are read off those steps.
+OCCUPANCY_GROUPS = ['venue', 'discipline']
+HOUR_NS = 3_600_000_000_000
+
+def sweep(starts, ends, groups):
+    """
+    Concurrency steps of [start, end) intervals (int64 ns) per group code, as arrays sorted by
+    (group, time): `levels[k]` sessions are open from `times[k]` to the group's next step.
+    Ends sort before starts at the same instant, so back-to-back sessions do not overlap.
+    """
+    times = np.concatenate([starts, ends])
+    deltas = np.concatenate([np.ones(len(starts), np.int32), np.full(len(ends), -1, np.int32)])
+    codes = np.concatenate([groups, groups])
+    order = np.lexsort((deltas, times, codes))
+    # Every group's deltas sum to 0, so one running total restarts at 0 for each group
+    return codes[order], times[order], np.cumsum(deltas[order])
+
+def group_bounds(codes):
+    """(start, stop) positions of each run of equal codes in a sorted code array."""
+    starts = np.flatnonzero(np.diff(codes, prepend=-1))
+    return starts, np.append(starts[1:], len(codes))
+
+def to_paris(ns):
+    return pd.to_datetime(ns, utc=True).tz_convert(SCHEDULE_TIMEZONE)
+
+class ScheduleIntervals:
+    """
+    load_schedule() sessions as int64 [start, end) arrays (UTC ns) plus venue / discipline
+    codes, queried for any subset of rows (positions from analytics.Analytics.schedule_rows()).
+    """
+    def __init__(self, schedule):
+        self.starts = schedule['start_date'].dt.tz_convert('UTC').to_numpy(dtype='datetime64[ns]').view(np.int64)
+        self.ends = schedule['end_date'].dt.tz_convert('UTC').to_numpy(dtype='datetime64[ns]').view(np.int64)
+        self.codes = {by: schedule[by].cat.codes.to_numpy() for by in OCCUPANCY_GROUPS}
+        self.labels = {by: schedule[by].cat.categories.astype(str) for by in OCCUPANCY_GROUPS}
+
+    def labelled(self, rows, by):
+        """The rows that have a `by` label, ordered by (group, start time), and their codes."""
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[self.codes[by][rows] >= 0]
+        rows = rows[np.lexsort((self.starts[rows], self.codes[by][rows]))]
+        return rows, self.codes[by][rows]
+
+    def steps(self, rows, by):
+        rows, codes = self.labelled(rows, by)
+        return sweep(self.starts[rows], self.ends[rows], codes)
+
+    def overlap_windows(self, rows, by):
+        """
+        labelled() rows plus, for each session i, `stop[i]`: sessions i+1 .. stop[i]-1 of the
+        same group start before i ends, i.e. overlap it. One binary search per session.
+        """
+        rows, codes = self.labelled(rows, by)
+        starts, ends = self.starts[rows], self.ends[rows]
+        stop = np.empty(len(rows), dtype=np.int64)
+        for lo, hi in zip(*group_bounds(codes)):
+            stop[lo:hi] = lo + np.searchsorted(starts[lo:hi], ends[lo:hi], side='left')
+        return rows, codes, stop
+
+    def overlaps(self, rows, by, limit=None):
+        """
+        Overlapping session pairs within each group: `by`, first, second (positions into
+        load_schedule(), first starting no later than second). Costs O(n log n + pairs);
+        `limit` keeps only the first pairs in (group, start) order.
+        """
+        rows, codes, stop = self.overlap_windows(rows, by)
+        counts = stop - np.arange(len(rows)) - 1
+        if limit is not None:
+            before = np.cumsum(counts) - counts
+            counts = np.clip(limit - before, 0, counts)
+        first = np.repeat(np.arange(len(rows)), counts)
+        second = first + 1 + np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return pd.DataFrame({by: self.labels[by][codes[first]], 'first': rows[first], 'second': rows[second]})
+
+    def summary(self, rows, by):
+        """
+        One row per group, busiest first: sessions, overlaps (overlapping session pairs), peak
+        (most sessions open at once) and peak_start, busy_hours (at least one session open),
+        idle_hours and longest_gap_hours (gaps between first_start and last_end).
+        """
+        rows, codes, stop = self.overlap_windows(rows, by)
+        columns = [by, 'sessions', 'overlaps', 'peak', 'peak_start', 'busy_hours', 'idle_hours',
+                   'longest_gap_hours', 'first_start', 'last_end']
+        if not len(rows):
+            return pd.DataFrame(columns=columns)
+        n_groups = len(self.labels[by])
+        group_ids = np.unique(codes)
+        sessions = np.bincount(codes, minlength=n_groups)
+        overlaps = np.bincount(codes, weights=stop - np.arange(len(rows)) - 1, minlength=n_groups)
+
+        step_codes, times, levels = sweep(self.starts[rows], self.ends[rows], codes)
+        lo, hi = group_bounds(step_codes)
+        # Segment k runs from times[k] to times[k + 1]; a group's last step only closes it
+        seg_codes = step_codes[:-1]
+        hours = np.where(seg_codes == step_codes[1:], np.diff(times), 0) / HOUR_NS
+        busy = np.bincount(seg_codes, weights=hours * (levels[:-1] > 0), minlength=n_groups)
+        gaps = hours * (levels[:-1] == 0)
+        idle = np.bincount(seg_codes, weights=gaps, minlength=n_groups)
+        longest = np.zeros(n_groups)
+        np.maximum.at(longest, seg_codes, gaps)
+        peak_at = np.array([start + np.argmax(levels[start:end]) for start, end in zip(lo, hi)])
+
+        summary = pd.DataFrame({
+            by: self.labels[by][group_ids],
+            'sessions': sessions[group_ids],
+            'overlaps': overlaps[group_ids].astype(int),
+            'peak': levels[peak_at],
+            'peak_start': to_paris(times[peak_at]),
+            'busy_hours': busy[group_ids].round(2),
+            'idle_hours': idle[group_ids].round(2),
+            'longest_gap_hours': longest[group_ids].round(2),
+            'first_start': to_paris(times[lo]),
+            'last_end': to_paris(times[hi - 1]),
+        }, columns=columns)
+        return summary.sort_values(['peak', 'busy_hours'], ascending=False, ignore_index=True)
+
+    def idle_gaps(self, rows, by, min_hours=0.0):
+        """Idle stretches of each group between sessions: `by`, start, end, hours (longest first)."""
+        step_codes, times, levels = self.steps(rows, by)
+        idle = np.flatnonzero((step_codes[:-1] == step_codes[1:]) & (levels[:-1] == 0))
+        hours = (times[idle + 1] - times[idle]) / HOUR_NS
+        idle, hours = idle[hours >= min_hours], hours[hours >= min_hours]
+        gaps = pd.DataFrame({
+            by: self.labels[by][step_codes[idle]], 'start': to_paris(times[idle]),
+            'end': to_paris(times[idle + 1]), 'hours': hours.round(2),
+        })
+        return gaps.sort_values('hours', ascending=False, ignore_index=True)
+
+    def occupancy_grid(self, rows, by, freq):
+        """
+        Heatmap grid: one row per group, one column per `freq` bin (Paris wall time), value =
+        most sessions open at once during that bin, 0 when idle. Its size is groups x bins
+        however many sessions are selected.
+        """
+        step_codes, times, levels = self.steps(rows, by)
+        if not len(step_codes):
+            return pd.DataFrame()
+        # Paris wall time: the Games run inside one DST period, one offset fits every session
+        local = times + pd.Timedelta(to_paris(times[:1])[0].utcoffset()).value
+        width = freq.value
+        origin = local.min() // width * width
+        open_steps = np.flatnonzero((step_codes[:-1] == step_codes[1:]) & (levels[:-1] > 0))
+        first_bin = (local[open_steps] - origin) // width
+        covered = (local[open_steps + 1] - 1 - origin) // width - first_bin + 1
+
+        group_ids = np.unique(step_codes)
+        grid = np.zeros((len(group_ids), int((local.max() - origin) // width) + 1), dtype=np.int32)
+        segment = np.repeat(np.arange(len(open_steps)), covered)
+        bins = first_bin[segment] + np.arange(len(segment)) - np.repeat(np.cumsum(covered) - covered, covered)
+        group_rows = np.searchsorted(group_ids, step_codes[open_steps])[segment]
+        np.maximum.at(grid, (group_rows, bins), levels[open_steps][segment])
+        columns = pd.to_datetime(origin + width * np.arange(grid.shape[1]))
+        return pd.DataFrame(grid, index=pd.Index(self.labels[by][group_ids], name=by), columns=columns)
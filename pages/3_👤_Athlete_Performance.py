@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import numpy as np
 import os
 import sys
 
@@ -8,51 +8,56 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import utils 
 
+# Plotly is heavy to import: loaded on first chart (utils.LazyModule)
+px = utils.LazyModule('plotly.express')
+go = utils.LazyModule('plotly.graph_objects')
+
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
     page_title="Athlete Performance - Paris 2024 Olympics",
     page_icon="👤",
     layout="wide"
 )
+utils.start_profile("Athlete Performance") # timings in the sidebar with ?profile=1 (see utils.PROFILE_ENV)
 
 # --- LOAD DATA & SIDEBAR ---
 athletes_df, medallists_df, nocs_df, events_df = utils.load_data()
-filters = utils.create_sidebar(athletes_df)
+filters = utils.create_sidebar()
 
 # --- APPLY GLOBAL FILTERS ---
 
 # 1. Filter Athletes DataFrame
-df_athletes_filtered = athletes_df[
-    (athletes_df['Continent'].isin(filters['continent'])) &
-    (athletes_df['country'].isin(filters['country'])) &
-    (athletes_df['disciplines'].isin(filters['sport'])) &
-    (athletes_df['gender'].isin(filters['gender'])) &
-    (athletes_df['Age'].between(filters['age'][0], filters['age'][1]))
-]
+df_athletes_filtered = utils.apply_filters(athletes_df, filters, 'athletes')
 
 # 2. Filter Medallists DataFrame (Now supports Age filtering via utils merge!)
-df_medals_filtered = medallists_df[
-    (medallists_df['Continent'].isin(filters['continent'])) &
-    (medallists_df['country'].isin(filters['country'])) &
-    (medallists_df['discipline'].isin(filters['sport'])) &
-    (medallists_df['gender'].isin(filters['gender'])) &
-    (medallists_df['Age'].between(filters['age'][0], filters['age'][1]))
-]
+df_medals_filtered = utils.apply_filters(medallists_df, filters, 'medallists')
+
+# Aggregates (age statistics, top athletes) come from the analytics API, cached per filter state
+api = utils.get_analytics()
 
 st.title("👤 Athlete Performance")
 
 # ==============================================================================
 # TASK 1: ATHLETE PROFILE CARD
 # ==============================================================================
+utils.profile_section("TASK 1: Athlete profile")
 st.header("1. Athlete Profile")
 
 if not df_athletes_filtered.empty:
-    # Search box only shows athletes from the filtered dataset
-    name_list = sorted(df_athletes_filtered['name'].unique())
-    selected_name = st.selectbox("🔎 Search for an athlete (in filtered list):", name_list)
+    # Search only athletes from the filtered dataset; the index returns row positions in athletes_df
+    search_index = utils.get_athlete_search()
+    filtered_rows = utils.get_filter_index('athletes').select(filters)
+    query = st.text_input("🔎 Search for an athlete (in filtered list):", placeholder="Name, accents and typos are fine")
+    matches = search_index.search(query, limit=20, rows=filtered_rows)
+    selected_row = st.selectbox(
+        "Matching athletes:", matches,
+        format_func=lambda row: f"{athletes_df['name'].iat[row]} ({athletes_df['country'].iat[row]})"
+    )
 
-    if selected_name:
-        athlete = df_athletes_filtered[df_athletes_filtered['name'] == selected_name].iloc[0]
+    if not matches:
+        st.info("No athlete in the filtered list matches this search.")
+    elif selected_row is not None:
+        athlete = athletes_df.iloc[selected_row]
 
         col1, col2 = st.columns([1,3])
 
@@ -80,11 +85,13 @@ if not df_athletes_filtered.empty:
             # Format disciplines
             disciplines_str = str(athlete['disciplines']).replace("[", "").replace("]", "").replace("'", "")
             
-            # Format coach
-            if pd.notna(athlete['coach']):
-                coach_str = str(athlete['coach']).replace("[", "").replace("]", "").replace("'", "")
+            # Coach: linked coaches from the relationship graph, else the free-text entry
+            graph = utils.get_relation_graph()
+            coach_summaries = [graph.coach_summary(coach) for coach in graph.athlete_coaches[selected_row]]
+            if coach_summaries:
+                coach_str = ', '.join(f"{c['name']} ({c['function']})" for c in coach_summaries)
             else:
-                coach_str = 'N/A'
+                coach_str = graph.coach_text[selected_row] or 'N/A'
             
             st.markdown(f"""
             **📍 Country:** {athlete['country']}
@@ -93,6 +100,11 @@ if not df_athletes_filtered.empty:
             **📏 Height:** {height}  &nbsp; | &nbsp; **⚖️ Weight:** {weight}
             **🎂 Age:** {athlete.get('Age', 'N/A')} years ({athlete.get('birth_date', 'N/A')})
             """)
+
+            # Coach-centred view: the coach's other athletes and what they won
+            for summary in coach_summaries:
+                st.caption(f"🧑‍🏫 {summary['name']} coaches {summary['athletes']} athlete(s), "
+                           f"who won {summary['medals']} medal(s) together.")
 else:
     st.warning("No athletes found for the current filters.")
 
@@ -101,40 +113,106 @@ st.divider()
 # ==============================================================================
 # TASK 2: AGE DISTRIBUTION
 # ==============================================================================
+utils.profile_section("TASK 2: Age distribution")
 st.subheader("📊 Athlete Age Distribution")
 
 if not df_athletes_filtered.empty:
-    # Use the filtered dataset directly
-    plot_data = df_athletes_filtered.copy()
+    # One row per athlete and discipline (multi-sport athletes appear under each selected sport)
+    plot_data = utils.explode_disciplines(df_athletes_filtered)
+    plot_data = plot_data[plot_data['discipline'].isin(filters['sport'])]
     
     # Optional Local Filter: Compare specific sports within the global selection
-    available_sports = sorted(plot_data['disciplines'].unique())
+    available_sports = sorted(plot_data['discipline'].unique())
     selected_sports_local = st.multiselect('Compare specific sports (Optional):', available_sports)
 
     if selected_sports_local: 
-        plot_data = plot_data[plot_data['disciplines'].isin(selected_sports_local)]
+        plot_data = plot_data[plot_data['discipline'].isin(selected_sports_local)]
 
-    # Display statistics
+    # Display statistics (each athlete once), from the analytics API
+    age_stats = api.age_stats(filters, sports=selected_sports_local).to_dict('records')[0]
+    athletes_by_gender = api.age_stats(filters, by='gender', sports=selected_sports_local).set_index('gender')['athletes']
     col1, col2, col3, col4, col5 = st.columns(5)
-    with col1: st.metric("Total Athletes", len(plot_data))
-    with col2: st.metric("Men", len(plot_data[plot_data['gender'] == 'Male']))
-    with col3: st.metric("Women", len(plot_data[plot_data['gender'] == 'Female']))
-    with col4: st.metric("Avg Age", f"{plot_data['Age'].mean():.1f}")
-    with col5: st.metric("Age Range", f"{plot_data['Age'].min():.0f} - {plot_data['Age'].max():.0f}")
-
-    if not plot_data.empty:
-        violin_fig = px.violin(
-            plot_data,
-            y='Age',
-            x='disciplines',
-            color="gender",
-            violinmode="overlay",
-            box=True,
-            points='all', # Warning: Can be slow if too many points
-            title="Age Distribution by Sport & Gender",
-            color_discrete_map={'Male': '#36A2EB', 'Female': '#FF6384'}
-        )
+    with col1: st.metric("Total Athletes", age_stats['athletes'])
+    with col2: st.metric("Men", athletes_by_gender.get('Male', 0))
+    with col3: st.metric("Women", athletes_by_gender.get('Female', 0))
+    with col4: st.metric("Avg Age", f"{age_stats['mean_age']:.1f}")
+    with col5: st.metric("Age Range", f"{age_stats['min_age']:.0f} - {age_stats['max_age']:.0f}")
+
+    gender_colors = {'Male': '#36A2EB', 'Female': '#FF6384'}
+
+    # Figures are cached per filter state + local sport selection (utils.cached_figure)
+    if not plot_data.empty and len(plot_data) <= utils.VIOLIN_POINT_BUDGET:
+        # Small selection: one point per athlete and sport (plot_data row) is drawn
+        def build_violin():
+            violin_fig = px.violin(
+                plot_data,
+                y='Age',
+                x='discipline',
+                color="gender",
+                violinmode="overlay",
+                box=True,
+                points='all',
+                title="Age Distribution by Sport & Gender",
+                color_discrete_map=gender_colors
+            )
+            return violin_fig
+
+        violin_fig = utils.cached_figure('athletes/violin_points', build_violin, filters, sports=sorted(selected_sports_local))
+        st.plotly_chart(violin_fig, use_container_width=True)
+    elif not plot_data.empty:
+        # Large selection: server-side KDE + box statistics + a sample of outliers per sport & gender
+        def build_violin_summary():
+            stats, curves, outliers = utils.summarize_distribution(plot_data, 'Age', ['discipline', 'gender'],
+                                                                   grid_size=utils.VIOLIN_GRID_SIZE)
+            sports = sorted(stats['discipline'].unique())
+            position = {sport: i for i, sport in enumerate(sports)}
+            peak = curves.groupby(['discipline', 'gender'], observed=True)['density'].transform('max')
+            curves['half_width'] = 0.4 * curves['density'] / peak
+
+            violin_fig = go.Figure()
+            for gender, color in gender_colors.items():
+                # Split violins: each gender draws one half (males left, females right), so every
+                # half-width is sent once. One outline trace per gender, polygons separated by NaN gaps
+                side = -1 if gender == 'Male' else 1
+                xs, ys = [], []
+                for sport, curve in curves[curves['gender'] == gender].groupby('discipline', observed=True):
+                    half_width, age = curve['half_width'].to_numpy(), curve['Age'].to_numpy()
+                    xs += [position[sport] + side * half_width, [position[sport], np.nan]]
+                    ys += [age, [age[0], np.nan]]
+                violin_fig.add_trace(go.Scatter(
+                    # float32 halves the (base64) payload; sub-pixel precision is all a plot needs
+                    x=np.concatenate(xs).astype('float32') if xs else [], y=np.concatenate(ys).astype('float32') if ys else [],
+                    fill='toself', mode='lines', name=gender, legendgroup=gender,
+                    # The spline keeps the coarse density grid smooth on screen
+                    line=dict(color=color, width=1, shape='spline'), opacity=0.5, hoverinfo='skip'
+                ))
+
+                box = stats[stats['gender'] == gender]
+                box_stats = {column: box[column].to_numpy(dtype='float32')
+                             for column in ['q1', 'median', 'q3', 'lowerfence', 'upperfence', 'mean']}
+                violin_fig.add_trace(go.Box(
+                    x=(box['discipline'].map(position) + side * 0.05).to_numpy(dtype='float32'), **box_stats,
+                    name=gender, legendgroup=gender, showlegend=False, marker_color=color, width=0.08, boxpoints=False
+                ))
+
+                points = outliers[outliers['gender'] == gender]
+                violin_fig.add_trace(go.Scatter(
+                    x=points['discipline'].map(position) + side * 0.05, y=points['Age'], mode='markers', name=gender,
+                    legendgroup=gender, showlegend=False, marker=dict(color=color, size=4)
+                ))
+
+            violin_fig.update_layout(
+                title="Age Distribution by Sport & Gender",
+                xaxis=dict(title='discipline', tickmode='array', tickvals=list(range(len(sports))), ticktext=sports),
+                yaxis=dict(title='Age'),
+                legend_title='gender'
+            )
+            return violin_fig
+
+        violin_fig = utils.cached_figure('athletes/violin_summary', build_violin_summary, filters, sports=sorted(selected_sports_local))
         st.plotly_chart(violin_fig, use_container_width=True)
+        st.caption(f"Summary view for {len(plot_data):,} points, one per athlete and sport (only outliers and very small groups are drawn). "
+                   f"Narrow the selection to {utils.VIOLIN_POINT_BUDGET:,} points or fewer to see every point.")
 else:
     st.warning("No data available for Age Distribution.")
 
@@ -143,6 +221,7 @@ st.divider()
 # ==============================================================================
 # TASK 3: GENDER DISTRIBUTION
 # ==============================================================================
+utils.profile_section("TASK 3: Gender distribution")
 st.subheader("👫 Gender Distribution")
 
 if not df_athletes_filtered.empty:
@@ -150,13 +229,17 @@ if not df_athletes_filtered.empty:
 
     # 3. Create Pie Chart
     if not plot_data_gender.empty:
-        fig_gender = px.pie(
-            plot_data_gender, 
-            names='gender', 
-            title=f"Gender Distribution",
-            color='gender',
-            color_discrete_map={'Male': '#36A2EB', 'Female': '#FF6384'}
-        )
+        def build_gender_pie():
+            fig_gender = px.pie(
+                plot_data_gender, 
+                names='gender', 
+                title=f"Gender Distribution",
+                color='gender',
+                color_discrete_map={'Male': '#36A2EB', 'Female': '#FF6384'}
+            )
+            return fig_gender
+
+        fig_gender = utils.cached_figure('athletes/gender_pie', build_gender_pie, filters)
         st.plotly_chart(fig_gender, use_container_width=True)
     else:
         st.info("No data for this specific grouping.")
@@ -168,6 +251,7 @@ st.divider()
 # ==============================================================================
 # TASK 4: TOP ATHLETES BY MEDAL COUNT
 # ==============================================================================
+utils.profile_section("TASK 4: Top athletes")
 st.subheader("🏅 Top Athletes by Medal Count")
 if not df_medals_filtered.empty:
     
@@ -176,69 +260,51 @@ if not df_medals_filtered.empty:
     sort_options = ['Gold', 'Silver', 'Bronze', 'Total']
     sel_sort = col_sort.multiselect("Sort Priority", sort_options, default=['Total'])
 
-    # 1. Pivot Data
-    df_pivot = df_medals_filtered.pivot_table(
-        index='name', 
-        columns='medal_type', 
-        aggfunc='size', 
-        fill_value=0
-    )
-
-    # Ensure columns exist
-    for medal in ['Gold Medal', 'Silver Medal', 'Bronze Medal']:
-        if medal not in df_pivot.columns: df_pivot[medal] = 0
+    def build_top_athletes():
+        # 1. Medal counts per athlete, sorted by the chosen priority (Total when none)
+        top_10_df = api.top_athletes(filters, sort_by=sel_sort, n=10)
 
-    # Calculate Total
-    df_pivot['Total'] = df_pivot['Gold Medal'] + df_pivot['Silver Medal'] + df_pivot['Bronze Medal']
-
-    # 2. Sort Data
-    map_sort = {'Gold': 'Gold Medal', 'Silver': 'Silver Medal', 'Bronze': 'Bronze Medal', 'Total': 'Total'}
-    
-    if not sel_sort:
-        sort_by_cols = ['Total']
-    else:
-        sort_by_cols = [map_sort[x] for x in sel_sort]
-
-    # Get Top 10
-    top_10_df = df_pivot.sort_values(sort_by_cols, ascending=False).head(10).reset_index()
+        # 2. Prepare Plot
+        df_plot = top_10_df.melt(
+            id_vars=['name', 'Total'], 
+            value_vars=['Gold Medal', 'Silver Medal', 'Bronze Medal'], 
+            var_name='medal_type', 
+            value_name='Count'
+        )
 
-    # 3. Prepare Plot
-    df_plot = top_10_df.melt(
-        id_vars=['name', 'Total'], 
-        value_vars=['Gold Medal', 'Silver Medal', 'Bronze Medal'], 
-        var_name='medal_type', 
-        value_name='Count'
-    )
+        # 3. Plot
+        fig_top = px.bar(
+            df_plot,
+            x="Count",
+            y="name",
+            color="medal_type",
+            title=f"Top 10 Athletes (Sorted by: {', '.join(sel_sort) if sel_sort else 'Total'})",
+            orientation='h',
+            text='Count',
+            color_discrete_map={
+                'Gold Medal': '#FFD700',
+                'Silver Medal': '#C0C0C0',
+                'Bronze Medal': '#CD7F32'
+            },
+            category_orders={
+                "name": top_10_df['name'].tolist(),
+                "medal_type": ['Gold Medal', 'Silver Medal', 'Bronze Medal'] 
+            }
+        )
 
-    # 4. Plot
-    fig_top = px.bar(
-        df_plot,
-        x="Count",
-        y="name",
-        color="medal_type",
-        title=f"Top 10 Athletes (Sorted by: {', '.join(sel_sort) if sel_sort else 'Total'})",
-        orientation='h',
-        text='Count',
-        color_discrete_map={
-            'Gold Medal': '#FFD700',
-            'Silver Medal': '#C0C0C0',
-            'Bronze Medal': '#CD7F32'
-        },
-        category_orders={
-            "name": top_10_df['name'].tolist(),
-            "medal_type": ['Gold Medal', 'Silver Medal', 'Bronze Medal'] 
-        }
-    )
+        fig_top.update_traces(textposition='inside', texttemplate='%{text}')
+        fig_top.update_layout(
+            yaxis=dict(title="", automargin=True),
+            xaxis=dict(title="Medal Count", showgrid=False),
+            legend=dict(orientation="h", title=None, y=-0.1),
+            height=500
+        )
+        return fig_top
 
-    fig_top.update_traces(textposition='inside', texttemplate='%{text}')
-    fig_top.update_layout(
-        yaxis=dict(title="", automargin=True),
-        xaxis=dict(title="Medal Count", showgrid=False),
-        legend=dict(orientation="h", title=None, y=-0.1),
-        height=500
-    )
-    
+    fig_top = utils.cached_figure('athletes/top_athletes', build_top_athletes, filters, sort=sel_sort)
     st.plotly_chart(fig_top, use_container_width=True)
 
 else:
-    st.warning("No medals found for the current Global Filters.")
\ No newline at end of file
+    st.warning("No medals found for the current Global Filters.")
+
+utils.finish_profile()
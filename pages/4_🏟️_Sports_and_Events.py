@@ -1,6 +1,5 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import os
 import sys
 
@@ -8,12 +7,16 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import utils 
 
+# Plotly is heavy to import: loaded on first chart (utils.LazyModule)
+px = utils.LazyModule('plotly.express')
+
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
     page_title="Sports & Events Analysis",
     page_icon="🏟️",
     layout="wide"
 )
+utils.start_profile("Sports and Events") # timings in the sidebar with ?profile=1 (see utils.PROFILE_ENV)
 
 st.title("🏟️ Sports & Events Analysis")
 
@@ -21,97 +24,65 @@ st.title("🏟️ Sports & Events Analysis")
 # Load Global Data via Utils
 athletes_df, medallists_df, nocs_df, events_df = utils.load_data()
 
-# Load Schedule Data (Specific to this page)
-current_dir = os.path.dirname(os.path.abspath(__file__))
-data_dir = os.path.join(current_dir, '..', 'data')
-
-file_path = os.path.join(data_dir, 'schedule.csv')
-if not os.path.exists(file_path):
-    file_path = os.path.join(data_dir, 'schedules.csv')
-
+# Load Schedule Data (Specific to this page): typed, cached and sorted by start time
 try:
-    schedule_df = pd.read_csv(file_path)
+    schedule_df = utils.load_schedule()
+    schedule_lookups = utils.get_schedule_lookups()
 except FileNotFoundError:
     st.error("Could not find schedule.csv")
     st.stop()
-
-# Preprocess Schedule
-schedule_df['start_date'] = pd.to_datetime(schedule_df['start_date'], errors='coerce')
-schedule_df['end_date'] = pd.to_datetime(schedule_df['end_date'], errors='coerce')
-schedule_df = schedule_df.dropna(subset=['start_date', 'end_date'])
-schedule_df.loc[schedule_df['start_date'] == schedule_df['end_date'], 'end_date'] += pd.Timedelta(minutes=30)
-schedule_df['Day'] = schedule_df['start_date'].dt.date
+api = utils.get_analytics() # query results are cached per filter state
 
 # --- SIDEBAR (GLOBAL FILTERS) ---
-filters = utils.create_sidebar(athletes_df)
+filters = utils.create_sidebar()
 
 # ==============================================================================
 # TASK 1: EVENT SCHEDULE (Local Filters Only)
 # ==============================================================================
+utils.profile_section("TASK 1: Event schedule")
 st.header("📅 Event Schedule (Gantt Chart)")
 
 col1, col2, col3 = st.columns(3)
 
 # A. Local Sport Filter
-all_sports = sorted(schedule_df['discipline'].unique())
+all_sports = schedule_lookups['sports']
 sel_sports = col1.multiselect("Filter by Sport", all_sports)
 if not sel_sports: sel_sports = all_sports 
 
-# Apply local sport filter
-filtered_by_sport = schedule_df[schedule_df['discipline'].isin(sel_sports)]
-
-# B. Local Venue Filter
-all_venues = sorted(filtered_by_sport['venue'].dropna().astype(str).unique())
+# B. Local Venue Filter (venues hosting the selected sports, from the lookup table)
+venues_by_sport = schedule_lookups['venues_by_sport']
+all_venues = sorted(set().union(*(venues_by_sport.get(sport, []) for sport in sel_sports)))
 sel_venues = col2.multiselect("Filter by Venue", all_venues)
 if not sel_venues: sel_venues = all_venues
 
-# Apply local venue filter
-filtered_by_sport_venue = filtered_by_sport[filtered_by_sport['venue'].isin(sel_venues)]
+# Apply local sport + venue filter (index lookup, rows stay sorted by start time)
+gantt_rows = api.schedule_rows(sel_sports, sel_venues)
 
 # C. Local Date Filter
-unique_dates = sorted(filtered_by_sport_venue['Day'].dropna().unique())
+unique_dates = sorted(schedule_df['Day'].iloc[gantt_rows].unique())
 date_options = ["All Dates"] + [d.strftime('%Y-%m-%d') for d in unique_dates]
 sel_date_str = col3.selectbox("Filter by Date", date_options)
 
-# Filter Final Data
-df_gantt = schedule_df[
-    (schedule_df['discipline'].isin(sel_sports)) &
-    (schedule_df['venue'].isin(sel_venues))
-]
-
 is_zoomed_in = False
 if sel_date_str != "All Dates":
     filter_date = pd.to_datetime(sel_date_str).date()
-    df_gantt = df_gantt[df_gantt['Day'] == filter_date]
+    gantt_rows = api.schedule_rows(sel_sports, sel_venues, day=filter_date)
     is_zoomed_in = True
 
-# Plot Task 1
-if not df_gantt.empty:
-    df_gantt = df_gantt.sort_values('start_date', ascending=False)
-    
-    # Coloring Logic
-    if len(sel_sports) <= 1 and len(sel_venues) > 1:
-        color_col = 'venue'
-    elif len(sel_venues) <= 1:
-        color_col = 'discipline'
-    else:
-        color_col = 'venue' if len(sel_sports) < len(all_sports) else 'discipline'
-
-    fig_timeline = px.timeline(
-        df_gantt,
-        x_start="start_date",
-        x_end="end_date",
-        y=color_col,
-        color=color_col,
-        hover_data=["discipline", "venue", "event", "start_date", "end_date"],
-        title=f"Schedule ({'Hourly View' if is_zoomed_in else 'Daily View'})"
-    )
+# Coloring Logic (shared by both levels of detail)
+if len(sel_sports) <= 1 and len(sel_venues) > 1:
+    color_col = 'venue'
+elif len(sel_venues) <= 1:
+    color_col = 'discipline'
+else:
+    color_col = 'venue' if len(sel_sports) < len(all_sports) else 'discipline'
 
-    if is_zoomed_in:
-        xaxis_config = dict(title="Time of Day", tickformat="%H:%M", dtick=7200000, gridcolor='rgba(255,255,255,0.1)')
-    else:
-        xaxis_config = dict(title="Date", tickformat="%d %b", dtick=86400000.0, gridcolor='rgba(255,255,255,0.1)')
+if is_zoomed_in:
+    xaxis_config = dict(title="Time of Day", tickformat="%H:%M", dtick=7200000, gridcolor='rgba(255,255,255,0.1)')
+else:
+    xaxis_config = dict(title="Date", tickformat="%d %b", dtick=86400000.0, gridcolor='rgba(255,255,255,0.1)')
 
+def style_timeline(fig_timeline):
     fig_timeline.update_layout(
         xaxis=xaxis_config,
         yaxis=dict(title=""),
@@ -120,27 +91,100 @@ if not df_gantt.empty:
         legend_title=color_col.capitalize(),
         showlegend=True
     )
+    return fig_timeline
+
+# Plot Task 1
+# Schedule charts only depend on the local filters; figures are cached per selection (utils.cached_figure)
+timeline_key = dict(sports=sorted(sel_sports), venues=sorted(sel_venues), date=sel_date_str)
+if 0 < len(gantt_rows) <= utils.GANTT_BAR_BUDGET:
+    # Drilled in (a date or a small selection): one bar per session, latest sessions first as before
+    df_gantt = schedule_df.iloc[gantt_rows[::-1]]
+
+    def build_timeline():
+        fig_timeline = px.timeline(
+            df_gantt,
+            x_start="start_date",
+            x_end="end_date",
+            y=color_col,
+            color=color_col,
+            hover_data=["discipline", "venue", "event", "start_date", "end_date"],
+            title=f"Schedule ({'Hourly View' if is_zoomed_in else 'Daily View'})"
+        )
+        return style_timeline(fig_timeline)
+
+    fig_timeline = utils.cached_figure('events/timeline', build_timeline, **timeline_key)
     st.plotly_chart(fig_timeline, use_container_width=True)
+elif len(gantt_rows):
+    # Zoomed out: one block per day (hour within a date) and venue / sport, with session counts
+    block_freq = utils.GANTT_BLOCK_FREQ['day' if is_zoomed_in else 'All Dates']
+    df_blocks = utils.schedule_blocks(gantt_rows, color_col, block_freq)
+
+    def build_timeline_blocks():
+        fig_timeline = px.timeline(
+            df_blocks.iloc[::-1],
+            x_start="start_date",
+            x_end="end_date",
+            y=color_col,
+            color=color_col,
+            hover_data={"sessions": True, "events": True, "medal_sessions": True,
+                        "venues" if color_col == 'discipline' else "disciplines": True},
+            title=f"Schedule ({'Hourly View' if is_zoomed_in else 'Daily View'}, "
+                  f"{len(gantt_rows):,} sessions in {len(df_blocks):,} blocks)"
+        )
+        return style_timeline(fig_timeline)
+
+    fig_timeline = utils.cached_figure('events/timeline_blocks', build_timeline_blocks, **timeline_key)
+    st.plotly_chart(fig_timeline, use_container_width=True)
+    st.caption(f"Each bar groups the sessions of one {'hour' if is_zoomed_in else 'day'} (hover for counts). "
+               f"Pick a date or narrow the selection below {utils.GANTT_BAR_BUDGET:,} sessions to see every session.")
 else:
     st.warning("No events found for this combination of filters.")
 
+# Venue occupancy: same local filters, one heatmap cell per venue (or sport) and time bin
+utils.profile_section("TASK 1: Venue occupancy")
+st.subheader("🔥 Venue Occupancy & Conflicts")
+occupancy_label = st.radio("Occupancy by", ["Venue", "Sport"], horizontal=True)
+occupancy_by = 'venue' if occupancy_label == "Venue" else 'discipline'
+
+if len(gantt_rows):
+    bin_size = utils.OCCUPANCY_BINS['day' if is_zoomed_in else 'All Dates']
+    occupancy_grid, occupancy_summary = utils.venue_occupancy(gantt_rows, occupancy_by, bin_size)
+
+    def build_occupancy():
+        fig_occupancy = px.imshow(
+            occupancy_grid,
+            aspect='auto',
+            color_continuous_scale='YlOrRd',
+            labels=dict(x="Time (Paris)", y="", color="Sessions"),
+            title=f"Concurrent sessions per {occupancy_label.lower()} ({int(bin_size.total_seconds() // 60)}-minute bins, peak per bin)"
+        )
+        fig_occupancy.update_layout(height=max(300, 22 * len(occupancy_grid) + 120))
+        return fig_occupancy
+
+    fig_occupancy = utils.cached_figure('events/occupancy', build_occupancy, **timeline_key, by=occupancy_by)
+    st.plotly_chart(fig_occupancy, use_container_width=True)
+
+    busiest = occupancy_summary.iloc[0]
+    kpi1, kpi2, kpi3 = st.columns(3)
+    kpi1.metric(f"Peak ({busiest[occupancy_by]})", f"{busiest['peak']} sessions", busiest['peak_start'].strftime('%d %b %H:%M'))
+    kpi2.metric("Overlapping session pairs", f"{occupancy_summary['overlaps'].sum():,}")
+    kpi3.metric("Longest idle gap", f"{occupancy_summary['longest_gap_hours'].max():.1f} h")
+    with st.expander(f"Occupancy per {occupancy_label.lower()} (peaks, busy and idle hours)"):
+        st.dataframe(occupancy_summary, use_container_width=True, hide_index=True)
+
 st.divider()
 
 # ==============================================================================
 # TASK 2: MEDAL COUNT BY SPORT (TREEMAP)
 # ==============================================================================
+utils.profile_section("TASK 2: Medal treemap")
 st.header("🧱 Medal Count by Sport (Treemap)")
 
 # --- FILTERING LOGIC ---
 # Apply Global Filters (Continent, Country, Gender, Age)
 # BUT IGNORE 'sport' filter as requested
-df_treemap_filtered = medallists_df[
-    (medallists_df['Continent'].isin(filters['continent'])) &
-    (medallists_df['country'].isin(filters['country'])) &
-    # (medallists_df['discipline'].isin(filters['sport'])) &  <-- IGNORED
-    (medallists_df['gender'].isin(filters['gender'])) &
-    (medallists_df['Age'].between(filters['age'][0], filters['age'][1]))
-]
+# Medal roll-up per discipline: team medals count once, not once per athlete
+df_treemap_filtered = api.medal_breakdown(filters, 'discipline', ignore=('sport',))
 
 # Local Checkboxes
 col1, col2, col3 = st.columns(3)
@@ -149,17 +193,8 @@ include_silver = col2.checkbox("🥈 Include Silver Medals", value=True)
 include_bronze = col3.checkbox("🥉 Include Bronze Medals", value=True)
 
 if not df_treemap_filtered.empty:
-    # Prepare Data
-    df_treemap = df_treemap_filtered.pivot_table(
-        index='discipline', 
-        columns='medal_type', 
-        aggfunc='size', 
-        fill_value=0
-    ).reset_index()
-
-    # Ensure columns exist
-    for medal in ['Gold Medal', 'Silver Medal', 'Bronze Medal']:
-        if medal not in df_treemap.columns: df_treemap[medal] = 0
+    # Prepare Data (Gold/Silver/Bronze columns always exist)
+    df_treemap = df_treemap_filtered.copy()
 
     # Calculate Total based on checkboxes
     df_treemap['Total'] = 0
@@ -171,16 +206,21 @@ if not df_treemap_filtered.empty:
     df_treemap = df_treemap[df_treemap['Total'] > 0]
 
     if not df_treemap.empty:
-        fig_treemap = px.treemap(
-            df_treemap,
-            path=['discipline'],
-            values='Total',
-            hover_data=['Gold Medal', 'Silver Medal', 'Bronze Medal'], 
-            title="Total Medals by Sport (Filtered by Demographics)",
-            color='Total',
-            color_continuous_scale='Viridis'
-        )
-        fig_treemap.update_traces(textinfo="label+value")
+        def build_treemap():
+            fig_treemap = px.treemap(
+                df_treemap,
+                path=['discipline'],
+                values='Total',
+                hover_data=['Gold Medal', 'Silver Medal', 'Bronze Medal'], 
+                title="Total Medals by Sport (Filtered by Demographics)",
+                color='Total',
+                color_continuous_scale='Viridis'
+            )
+            fig_treemap.update_traces(textinfo="label+value")
+            return fig_treemap
+
+        fig_treemap = utils.cached_figure('events/treemap', build_treemap, filters, ('continent', 'country', 'gender', 'age'),
+            gold=include_gold, silver=include_silver, bronze=include_bronze)
         st.plotly_chart(fig_treemap, use_container_width=True)
     else:
         st.warning("No medals match the current filters.")
@@ -192,60 +232,32 @@ st.divider()
 # ==============================================================================
 # TASK 3: VENUE MAP
 # ==============================================================================
+utils.profile_section("TASK 3: Venue map")
 st.header("📍 Olympic Venues Map")
 
-# Use schedule_df which is already loaded
-venues_with_locations = schedule_df[['venue', 'location_description']].drop_duplicates()
-
-# City Coordinate Mapping (Your Logic)
-city_coordinates = {
-    'Paris': {'lat': 48.8566, 'lon': 2.3522},
-    'Saint-Etienne': {'lat': 45.4397, 'lon': 4.3872},
-    'Lyon': {'lat': 45.7640, 'lon': 4.8357},
-    'Marseille': {'lat': 43.2965, 'lon': 5.3698},
-    'Bordeaux': {'lat': 44.8378, 'lon': -0.5792},
-    'Nantes': {'lat': 47.2184, 'lon': -1.5536},
-    'Nice': {'lat': 43.7102, 'lon': 7.2620},
-    'Versailles': {'lat': 48.8049, 'lon': 2.1204},
-    'Tahiti': {'lat': -17.6509, 'lon': -149.4260},
-    'Vaires-sur-Marne': {'lat': 48.8656, 'lon': 2.6361},
-    'Saint-Quentin-en-Yvelines': {'lat': 48.7864, 'lon': 2.0350},
-    'Chateauroux': {'lat': 46.8109, 'lon': 1.6914},
-    'Colombes': {'lat': 48.9220, 'lon': 2.2530}
-}
-
-def get_coords_from_location(location_desc):
-    if pd.isna(location_desc): return None, None
-    for city, coords in city_coordinates.items():
-        if city.lower() in location_desc.lower():
-            return coords['lat'], coords['lon']
-    return city_coordinates['Paris']['lat'], city_coordinates['Paris']['lon']
-
-# Map Coordinates
-venues_with_locations['lat'], venues_with_locations['lon'] = zip(*venues_with_locations['location_description'].apply(get_coords_from_location))
-venues_map_df = venues_with_locations.dropna(subset=['lat', 'lon'])
-
-# Get Sports per Venue for Tooltip
-venue_sports = schedule_df.groupby('venue')['discipline'].apply(lambda x: ', '.join(sorted(set(x)))).reset_index()
-venue_sports.columns = ['venue', 'sports_display']
-
-# Merge
-venues_map_df = venues_map_df.merge(venue_sports, on='venue', how='left')
-
-# Plot
-fig_map = px.scatter_mapbox(
-    venues_map_df,
-    lat='lat',
-    lon='lon',
-    hover_name='venue',
-    hover_data={'sports_display': True, 'lat': False, 'lon': False},
-    zoom=5,
-    height=450,
-    title='Paris 2024 Olympic Venues',
-    color_discrete_sequence=['#FF6B6B']
-)
-fig_map.update_traces(marker=dict(size=15))
-fig_map.update_layout(mapbox_style="open-street-map", margin={"r": 0, "t": 40, "l": 0, "b": 0})
+# The venue map does not depend on any filter: built once per data version
+def build_venue_map():
+    # Venue dimension table: per-venue coordinates, sports and event counts are precomputed (utils.load_venues)
+    venues_map_df = utils.load_venues().dropna(subset=['lat', 'lon'])
+
+    # Plot
+    fig_map = px.scatter_mapbox(
+        venues_map_df,
+        lat='lat',
+        lon='lon',
+        hover_name='venue',
+        hover_data={'sports_display': True, 'n_events': True, 'city': True, 'lat': False, 'lon': False},
+        zoom=5,
+        height=450,
+        title='Paris 2024 Olympic Venues',
+        color_discrete_sequence=['#FF6B6B']
+    )
+    fig_map.update_traces(marker=dict(size=15))
+    fig_map.update_layout(mapbox_style="open-street-map", margin={"r": 0, "t": 40, "l": 0, "b": 0})
+    return fig_map
 
+fig_map = utils.cached_figure('events/venue_map', build_venue_map)
 st.plotly_chart(fig_map, use_container_width=True)
-st.info("💡 Hover over markers to see venue names and sports. Zoom in/out to explore the map!")
\ No newline at end of file
+st.info("💡 Hover over markers to see venue names and sports. Zoom in/out to explore the map!")
+
+utils.finish_profile()
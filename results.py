@@ -0,0 +1,253 @@
+# results.py
+# Per-discipline competition results (data/results/*.csv).
+# Files are discovered up front but only parsed when a discipline is first asked for;
+# cross-discipline views parse the missing ones in parallel.
+import streamlit as st
+import pandas as pd
+import numpy as np
+import os
+import glob
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import utils
+
+RESULTS_DIR = os.path.join(utils.DATA_DIR, 'results')
+
+# Columns every row carries. Anything else a sport adds (bib, start_order,
+# result_WLT, qualification_mark, ...) goes to the long-format extras table.
+RESULT_COLUMNS = [
+    'date', 'stage_code', 'event_code', 'event_name', 'event_stage', 'stage', 'gender',
+    'discipline_name', 'discipline_code', 'venue',
+    'participant_code', 'participant_name', 'participant_type', 'participant_country_code', 'participant_country',
+    'rank', 'result', 'result_type', 'result_IRM', 'result_diff',
+]
+RESULT_CATEGORIES = [
+    'stage_code', 'event_code', 'event_name', 'event_stage', 'stage', 'gender', 'discipline_name', 'discipline_code',
+    'venue', 'participant_type', 'participant_country_code', 'participant_country', 'result_type', 'result_IRM',
+]
+EXTRA_COLUMNS = ['discipline_name', 'result_id', 'field', 'value']
+
+# Typed performance, derived from result / result_type / result_diff at parse time
+PERFORMANCE_COLUMNS = ['round', 'performance', 'unit', 'higher_is_better', 'margin']
+CATEGORY_COLUMNS = RESULT_CATEGORIES + ['round', 'unit']
+# result_type -> (unit, higher is better). Types missing here (FAULT, IRM, IRM_RANK) carry no measure.
+RESULT_UNITS = {
+    'TIME': ('s', False), 'DISTANCE': ('m', True), 'POINTS': ('pts', True), 'IRM_POINTS': ('pts', True),
+    'PERCENT': ('%', True), 'STROKES': ('strokes', False), 'WEIGHT': ('kg', True),
+    'SCORE': ('score', True), 'SETS': ('sets', True),
+}
+# Disciplines where fewer points win (sailing net points, equestrian penalties)
+LOWER_POINTS_DISCIPLINES = {'Sailing', 'Equestrian'}
+# Stages with at most this many measured participants are matches, not ranked fields
+HEAD_TO_HEAD_SIZE = 2
+LEADERBOARD_COLUMNS = [
+    'discipline_name', 'event_code', 'event_name', 'round', 'stage_code', 'stage', 'date',
+    'participant_code', 'participant_name', 'participant_country_code', 'performance', 'unit', 'higher_is_better',
+]
+# Heats / groups of one round share a leaderboard: 'Round 1 - Heat 2' -> 'Round 1', 'Semifinal 1' -> 'Semifinal'
+ROUND_SUFFIX = r'(?i)(?:\s*-)?\s+(?:heat|group|pool)\s+\w+$|(?<=final)\s+\d+$'
+
+def discover_results(results_dir=RESULTS_DIR):
+    """Discipline name (file name without .csv) -> path. No file is read."""
+    paths = sorted(glob.glob(os.path.join(results_dir, '*.csv')))
+    return {os.path.splitext(os.path.basename(path))[0]: path for path in paths}
+
+def parse_measure(values):
+    """
+    Result strings -> float, vectorized. Clock times ('1:51:09.6', '3:10.61') become seconds,
+    plain numbers stay as they are, a leading '+' is dropped; anything else ('FLT (3)') is NaN.
+    """
+    text = pd.Series(values, dtype='string').str.strip().str.lstrip('+')
+    negative = text.str.startswith('-').fillna(False).to_numpy()
+    parts = text.str.lstrip('-').str.split(':', n=2, expand=True)
+    numbers = parts.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    n_parts = parts.notna().sum(axis=1).to_numpy()[:, None]
+    column = np.arange(numbers.shape[1])[None, :]
+    used = column < n_parts
+    seconds = np.where(used, numbers * 60.0 ** (n_parts - 1 - column), 0.0).sum(axis=1)
+    seconds[(used & np.isnan(numbers)).any(axis=1) | (n_parts[:, 0] == 0)] = np.nan
+    return np.where(negative, -seconds, seconds)
+
+def add_performance(table, discipline):
+    """Adds PERFORMANCE_COLUMNS: round, performance (float), unit, higher_is_better, margin (parsed result_diff)."""
+    result_type = table['result_type'].astype(str)
+    units = result_type.map({key: unit for key, (unit, _) in RESULT_UNITS.items()})
+    higher = result_type.map({key: higher for key, (_, higher) in RESULT_UNITS.items()})
+    if discipline in LOWER_POINTS_DISCIPLINES:
+        higher = higher.mask(units == 'pts', False)
+
+    table['round'] = table['stage'].astype('string').str.replace(ROUND_SUFFIX, '', regex=True).astype('category')
+    table['performance'] = np.where(units.notna(), parse_measure(table['result']), np.nan)
+    table['unit'] = units.astype('category')
+    table['higher_is_better'] = higher.astype('boolean')
+    table['margin'] = parse_measure(table['result_diff'])
+    return table
+
+def parse_results_file(path, discipline):
+    """
+    One results CSV -> (table, extras).
+    table: RESULT_COLUMNS + 'result_id' (row number in the file) + PERFORMANCE_COLUMNS, typed.
+    extras: one row per non-empty sport-specific cell (discipline_name, result_id, field, value).
+    """
+    dtypes = {col: ('category' if col in RESULT_CATEGORIES else str) for col in RESULT_COLUMNS}
+    raw = pd.read_csv(path, dtype=dtypes, keep_default_na=False, na_values=[''])
+    # Sport-specific columns stay as plain strings (extras are strings anyway)
+    raw = raw.astype({col: str for col in raw.columns if col not in RESULT_COLUMNS})
+    result_id = np.arange(len(raw), dtype='int32')
+
+    table = raw.reindex(columns=RESULT_COLUMNS)
+    table.insert(0, 'result_id', result_id)
+    table['date'] = pd.to_datetime(table['date'], errors='coerce', utc=True, format='ISO8601').dt.tz_convert(utils.SCHEDULE_TIMEZONE)
+    table['rank'] = pd.to_numeric(table['rank'], errors='coerce').astype('Int16')
+    for col in RESULT_CATEGORIES:
+        if not isinstance(table[col].dtype, pd.CategoricalDtype):
+            table[col] = table[col].astype('category') # column missing in this file
+    if table['discipline_name'].isna().all():
+        table['discipline_name'] = pd.Categorical([discipline] * len(table))
+    table = add_performance(table, discipline)
+
+    parts = []
+    for field in (col for col in raw.columns if col not in RESULT_COLUMNS):
+        present = raw[field].notna().to_numpy()
+        parts.append(pd.DataFrame({'result_id': result_id[present], 'field': field, 'value': raw[field].to_numpy()[present]}))
+    extras = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=EXTRA_COLUMNS[1:])
+    extras.insert(0, 'discipline_name', discipline)
+    return table, extras
+
+def combine(parts):
+    """Concatenates per-discipline (table, extras) pairs; categoricals are re-unified."""
+    if not parts:
+        return (pd.DataFrame(columns=['result_id'] + RESULT_COLUMNS + PERFORMANCE_COLUMNS), pd.DataFrame(columns=EXTRA_COLUMNS))
+    tables = [table for table, _ in parts]
+    # Union the per-file categories first, otherwise concat falls back to object columns
+    dtypes = {
+        col: pd.CategoricalDtype(sorted(set().union(*(t[col].cat.categories.astype(str) for t in tables))))
+        for col in CATEGORY_COLUMNS
+    }
+    tables = [t.astype(dtypes) for t in tables]
+    table = pd.concat(tables, ignore_index=True)
+    extras = pd.concat([extras for _, extras in parts], ignore_index=True)
+    for col in ('discipline_name', 'field'):
+        extras[col] = extras[col].astype('category')
+    return table, extras
+
+def rank_performances(table):
+    """
+    Stage leaderboard: every measured performance (no IRM, not a head-to-head event) ranked within
+    its event round, heats pooled ('Round 1 - Heat 2' competes with the other Round 1 heats).
+    behind_leader / behind_previous are in the row's unit, >= 0, NaN for the leader.
+    """
+    measured = table[table['performance'].notna() & table['result_IRM'].isna() & table['unit'].notna()]
+    field_size = measured.groupby(['event_code', 'stage_code'], observed=True)['stage_code'].transform('size')
+    largest_field = field_size.groupby(measured['event_code'], observed=True).transform('max')
+    measured = measured[largest_field > HEAD_TO_HEAD_SIZE]
+
+    board = measured[LEADERBOARD_COLUMNS].copy()
+    # score: larger is better whatever the direction of the unit
+    score = np.where(board['higher_is_better'].to_numpy(dtype=bool), 1.0, -1.0) * board['performance'].to_numpy()
+    keys = ['event_code', 'round', 'unit']
+    board = board.assign(score=score).sort_values(keys + ['score'], ascending=[True, True, True, False], kind='stable')
+    grouped = board.groupby(keys, observed=True)['score']
+    board['perf_rank'] = grouped.rank(method='min', ascending=False).astype('Int16')
+    board['behind_leader'] = (grouped.transform('max') - board['score']).where(board['perf_rank'] > 1).round(3)
+    board['behind_previous'] = (0.0 - grouped.diff()).round(3)
+    return board.drop(columns='score').reset_index(drop=True)
+
+def national_bests(board):
+    """
+    Best mark per country and event from a rank_performances() board (lowest time, longest
+    distance, ...), nations ranked on it, ties sharing a rank.
+    Events mixing units (decathlon, modern pentathlon) are compared per round instead.
+    """
+    units_per_event = board.groupby('event_code', observed=True)['unit'].transform('nunique')
+    segment = board['round'].astype(str).where(units_per_event > 1, '')
+    # score: larger is better whatever the direction of the unit; the earliest of equal marks is kept
+    score = np.where(board['higher_is_better'].to_numpy(dtype=bool), 1.0, -1.0) * board['performance'].to_numpy()
+    best = board.assign(segment=segment, score=score).sort_values(['score', 'date'], ascending=[False, True], kind='stable')
+    keys = ['event_code', 'segment', 'unit']
+    best = best.drop_duplicates(keys + ['participant_country_code'])
+    best = best.sort_values(keys, kind='stable')
+    best['nation_rank'] = best.groupby(keys, observed=True)['score'].rank(method='min', ascending=False).astype('Int16')
+    return best.drop(columns=['score', 'perf_rank', 'behind_leader', 'behind_previous']).reset_index(drop=True)
+
+class ResultsStore:
+    """
+    Lazy, thread-safe cache of parsed results, one entry per discipline.
+    get() parses a single discipline on first access; load() parses whatever is
+    missing in parallel and returns the unified table.
+    """
+    def __init__(self, results_dir=RESULTS_DIR):
+        self.paths = discover_results(results_dir)
+        self.parsed = {}
+        self.leaderboards = {}
+        self.lock = threading.Lock()
+
+    def disciplines(self):
+        return list(self.paths)
+
+    def loaded(self):
+        return sorted(self.parsed)
+
+    def get(self, discipline):
+        """(table, extras) for one discipline."""
+        if discipline not in self.parsed:
+            if discipline not in self.paths:
+                raise KeyError(f"No results file for discipline '{discipline}'")
+            parsed = parse_results_file(self.paths[discipline], discipline)
+            with self.lock:
+                self.parsed.setdefault(discipline, parsed)
+        return self.parsed[discipline]
+
+    def leaderboard(self, discipline):
+        """(stage board, national bests) for one discipline, computed once."""
+        if discipline not in self.leaderboards:
+            board = rank_performances(self.get(discipline)[0])
+            with self.lock:
+                self.leaderboards.setdefault(discipline, (board, national_bests(board)))
+        return self.leaderboards[discipline]
+
+    def load(self, disciplines=None, max_workers=None, use_processes=False):
+        """
+        Unified (table, extras) for several disciplines (default: all).
+        Missing disciplines are parsed with a thread pool (or a process pool,
+        which avoids the GIL for the pure-Python part of the parsing).
+        """
+        disciplines = self.disciplines() if disciplines is None else list(disciplines)
+        missing = [d for d in disciplines if d not in self.parsed]
+        if len(missing) > 1:
+            executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+            with executor_class(max_workers=max_workers) as pool:
+                parsed = pool.map(parse_results_file, [self.paths[d] for d in missing], missing)
+                for discipline, result in zip(missing, parsed):
+                    with self.lock:
+                        self.parsed.setdefault(discipline, result)
+        return combine([self.get(d) for d in disciplines])
+
+@st.cache_resource
+def get_results_store():
+    return ResultsStore()
+
+def load_results(discipline):
+    """(table, extras) for one discipline, e.g. load_results('Athletics')."""
+    return get_results_store().get(discipline)
+
+def load_all_results(disciplines=None, max_workers=None):
+    """Unified (table, extras) across disciplines, parsed in parallel on first use."""
+    return get_results_store().load(disciplines, max_workers=max_workers)
+
+def load_leaderboard(discipline):
+    """(stage board, national bests) for one discipline, e.g. load_leaderboard('Swimming')."""
+    return get_results_store().leaderboard(discipline)
+
+def with_extras(table, extras, fields):
+    """Adds sport-specific `fields` (e.g. ['bib', 'start_order']) as columns to `table`, NaN where absent."""
+    keys = ['discipline_name', 'result_id']
+    wanted = extras[extras['field'].isin(fields)]
+    wide = wanted.pivot_table(index=keys, columns='field', values='value', aggfunc='first', observed=True)
+    wide = wide.reindex(columns=fields).rename_axis(columns=None).reset_index()
+    # merge on plain strings so differing category sets do not matter
+    wide['discipline_name'] = wide['discipline_name'].astype(str)
+    merged = table.assign(discipline_name=table['discipline_name'].astype(str)).merge(wide, on=keys, how='left')
+    merged['discipline_name'] = merged['discipline_name'].astype(table['discipline_name'].dtype)
+    return merged
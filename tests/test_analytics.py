@@ -0,0 +1,100 @@
+# tests/test_analytics.py
+# Tests of the analytics API on a small in-test dataset (medals counted by hand) and on the
+# tracked schedule in data/:
+#   python -m pytest -q tests
+import os
+import subprocess
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+import datalayer
+from analytics import Analytics
+
+# name, country, Continent, discipline, event, medal_type, gender, Age, code_team, code_athlete
+MEDALLISTS = [
+    ('A', 'France', 'Europe', 'Swimming', '100m Freestyle', 'Gold Medal', 'Male', 22, None, '1'),
+    ('A', 'France', 'Europe', 'Swimming', '400m Freestyle', 'Silver Medal', 'Male', 22, None, '1'),
+    # Two bronzes of the same event and country are two medals
+    ('B', 'France', 'Europe', 'Judo', 'Women -57 kg', 'Bronze Medal', 'Female', 19, None, '2'),
+    ('C', 'France', 'Europe', 'Judo', 'Women -57 kg', 'Bronze Medal', 'Female', 24, None, '3'),
+    # Team medals: one medal per code_team
+    ('D', 'United States', 'North America', 'Basketball', 'Men', 'Silver Medal', 'Male', 28, 'BKBMTEAM5-USA', '4'),
+    ('E', 'United States', 'North America', 'Basketball', 'Men', 'Silver Medal', 'Male', 30, 'BKBMTEAM5-USA', '5'),
+    ('F', 'United States', 'North America', 'Basketball', 'Men', 'Silver Medal', 'Male', 28, 'BKBMTEAM5-USA', '6'),
+    ('G', 'Kenya', 'Africa', 'Athletics', 'Women Marathon', 'Gold Medal', 'Female', 30, None, '7'),
+    ('H', 'Japan', 'Asia', 'Athletics', '4 x 400m Relay Mixed', 'Gold Medal', 'Male', 25, 'ATHXTEAM4-JPN', '8'),
+    ('I', 'Japan', 'Asia', 'Athletics', '4 x 400m Relay Mixed', 'Gold Medal', 'Female', 26, 'ATHXTEAM4-JPN', '9'),
+]
+# name, country, Continent, gender, Age, disciplines
+ATHLETES = [
+    ('A', 'France', 'Europe', 'Male', 22, 'Swimming'),
+    ('B', 'France', 'Europe', 'Female', 19, 'Judo'),
+    ('C', 'France', 'Europe', 'Female', 24, 'Judo'),
+    ('D', 'United States', 'North America', 'Male', 28, 'Basketball'),
+    ('E', 'United States', 'North America', 'Male', 30, 'Basketball'),
+    ('F', 'United States', 'North America', 'Male', 28, 'Basketball'),
+    ('G', 'Kenya', 'Africa', 'Female', 30, 'Athletics'),
+    ('H', 'Japan', 'Asia', 'Male', 25, 'Athletics'),
+    ('I', 'Japan', 'Asia', 'Female', 26, 'Athletics'),
+    ('J', 'France', 'Europe', 'Male', None, 'Athletics, Swimming'),
+]
+
+
+@pytest.fixture(scope='module')
+def api():
+    medallists = pd.DataFrame(MEDALLISTS, columns=['name', 'country', 'Continent', 'discipline', 'event', 'medal_type',
+                                                   'gender', 'Age', 'code_team', 'code_athlete'])
+    athletes = pd.DataFrame(ATHLETES, columns=['name', 'country', 'Continent', 'gender', 'Age', 'disciplines'])
+    events = pd.DataFrame({'sport': ['Swimming', 'Swimming', 'Judo', 'Basketball', 'Athletics', 'Athletics'],
+                           'event': ['100m Freestyle', '400m Freestyle', 'Women -57 kg', 'Men', 'Women Marathon',
+                                     '4 x 400m Relay Mixed']})
+    return Analytics(athletes, medallists, pd.DataFrame(), events, schedule=datalayer.read_schedule())
+
+
+def test_medal_standings_count_team_medals_once(api):
+    standings = api.medal_standings()
+    totals = standings[datalayer.MEDAL_TYPES + ['Total']].sum()
+    assert totals.to_dict() == {'Gold Medal': 3, 'Silver Medal': 2, 'Bronze Medal': 2, 'Total': 7}
+    assert standings['country'].tolist() == ['France', 'Japan', 'Kenya', 'United States']
+    assert standings['rank'].tolist() == [1, 2, 2, 2]
+
+
+def test_filters_keep_a_team_medal_once(api):
+    # One female member is enough for the mixed relay, counted once
+    assert api.medal_rollup({'gender': ['Female']}, ['medal_type']).set_index('medal_type')['Medal_Count'].to_dict() == \
+        {'Gold Medal': 2, 'Bronze Medal': 2}
+    assert api.medal_breakdown({'age': (25, 27)}, 'country').to_dict('records') == \
+        [{'country': 'Japan', 'Gold Medal': 1, 'Silver Medal': 0, 'Bronze Medal': 0, 'Total': 1}]
+    assert api.continent_rollup({'sport': ['Athletics']})['Continent'].tolist() == ['Africa', 'Asia']
+
+
+def test_athletes_and_kpis(api):
+    assert api.top_athletes(sort_by=['Gold', 'Total'], n=1).to_dict('records') == \
+        [{'name': 'A', 'Gold Medal': 1, 'Silver Medal': 1, 'Bronze Medal': 0, 'Total': 2}]
+    assert api.athlete_rows(sports=['Athletics']).tolist() == [6, 7, 8, 9]
+    assert api.kpis() == {'athletes': 10, 'countries': 4, 'sports': 4, 'medals': 7, 'events': 6}
+    assert api.kpis({'sport': ['Judo']})['events'] == 1
+    stats = api.age_stats(by='gender').set_index('gender')
+    assert stats.loc['Female', 'mean_age'] == pytest.approx(24.75)
+
+
+@pytest.mark.parametrize('day', [date(2024, 7, 24), date(2024, 7, 28), date(2024, 8, 11), date(2024, 9, 1)])
+@pytest.mark.parametrize('sports', [None, ['Athletics', 'Swimming']])
+def test_schedule_rows_match_brute_force(api, day, sports):
+    schedule = api.schedule
+    start = pd.Timestamp(day).tz_localize(datalayer.SCHEDULE_TIMEZONE)
+    mask = (schedule['start_date'] < start + pd.Timedelta(days=1)) & (schedule['end_date'] > start)
+    if sports is not None:
+        mask &= schedule['discipline'].isin(sports)
+    np.testing.assert_array_equal(api.schedule_rows(sports, day=day), np.flatnonzero(mask.to_numpy()))
+
+
+def test_import_does_not_need_streamlit():
+    code = "import sys, analytics; assert 'streamlit' not in sys.modules"
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
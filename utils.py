@@ -1,91 +1,274 @@
 # utils.py
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
-import pycountry_convert as pc
-from datetime import date
-import pycountry 
+import re
+import json
+import time
+import functools
+import contextlib
+import bisect
+import threading
+import unicodedata
+from datetime import datetime
 
-# --- 1. HELPER FUNCTIONS ---
-def get_continent(country_name):
+import analytics
+# The data layer (parsing, snapshots, resolver, indexes) has no Streamlit dependency and lives
+# in datalayer.py; its names are re-exported here so pages and scripts keep using utils.*
+from datalayer import (
+    LazyModule, pycountry, pc,
+    get_continent, age_reference_date, calculate_age, calculate_ages, map_continents,
+    DATA_DIR, SNAPSHOT_DIR, SNAPSHOT_VERSION, SNAPSHOT_SOURCES, SNAPSHOT_TABLES, AGE_REFERENCE, TABLE_SOURCES,
+    clean_athletes, clean_medallists, build_tables, build_datasets, SHARED_CATEGORIES, SMALL_INT_COLUMNS,
+    CATEGORY_MAX_UNIQUE_RATIO, compact_numeric, compact_frames, memory_report, write_arrow, arrow_to_frame,
+    read_arrow, is_fingerprint, file_digest, combine_digests, SourceTracker, source_fingerprint, write_snapshot,
+    read_snapshot, build_snapshot, watch_sources, SHARED_DATA_ENV, MANIFEST_FILE, publish_snapshot,
+    DataVersion, make_version, DataStore,
+    NOC_ISO3_OVERRIDES, ISO3_CONTINENT_OVERRIDES, resolve_iso3, continent_from_iso3, build_country_index,
+    index_fingerprint, load_country_index, country_lookup, unresolved_countries, get_iso3_code,
+    build_athlete_disciplines, FILTER_COLUMNS, RANGE_FILTERS, filter_key, FilterIndex,
+    MEDAL_KEY, MEDAL_TYPES, MEDAL_IDENTITY, medal_holders, build_medal_facts,
+    SCHEDULE_TIMEZONE, SCHEDULE_CATEGORIES, read_schedule,
+    FIGURE_CACHE_SIZE, figure_key, FigureCache,
+    OCCUPANCY_GROUPS, HOUR_NS, sweep, group_bounds, to_paris, ScheduleIntervals,
+)
+
+# --- 0. PROFILING HOOKS ---
+# Off unless DASHBOARD_PROFILE=1 is set or the page is opened with ?profile=1.
+# A page calls start_profile() / profile_section() / finish_profile(); utils functions
+# decorated with @profiled and profile() blocks are then timed inside the current section.
+PROFILE_ENV = 'DASHBOARD_PROFILE'
+PROFILE_LOG = os.environ.get('DASHBOARD_PROFILE_LOG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profile.jsonl'))
+_profile_state = threading.local()   # one rerun per thread (Streamlit runs each session's script in its own thread)
+_profile_log_lock = threading.Lock()
+_NO_PROFILE = contextlib.nullcontext()
+
+def profiling_enabled():
+    if os.environ.get(PROFILE_ENV, '').lower() in ('1', 'true', 'yes'):
+        return True
+    try:
+        return st.query_params.get('profile', '').lower() in ('1', 'true', 'yes')
+    except Exception: # no Streamlit runtime (scripts, benchmarks)
+        return False
+
+class RerunProfile:
+    """Timings of one script run: page sections in order, each with the timed calls made inside it."""
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.sections = []
+        self.section_start = self.started
+        self.current = {'section': 'setup', 'calls': []}
+
+    def close_section(self):
+        now = time.perf_counter()
+        self.current['ms'] = round(1000 * (now - self.section_start), 2)
+        self.sections.append(self.current)
+        self.section_start = now
+
+    def record(self, name, seconds):
+        self.current['calls'].append({'name': name, 'ms': round(1000 * seconds, 2)})
+
+    def as_dict(self):
+        return {
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            'page': self.page,
+            'total_ms': round(1000 * (time.perf_counter() - self.started), 2),
+            'sections': self.sections,
+        }
+
+def start_profile(page):
+    """Starts timing this rerun of `page` if profiling is enabled."""
+    _profile_state.profile = RerunProfile(page) if profiling_enabled() else None
+
+def profile_section(name):
+    """Closes the running page section and opens `name` (e.g. 'TASK 2: Age distribution')."""
+    active = getattr(_profile_state, 'profile', None)
+    if active is not None:
+        active.close_section()
+        active.current = {'section': name, 'calls': []}
+
+@contextlib.contextmanager
+def _timed(active, name):
+    start = time.perf_counter()
     try:
-        country_alpha2 = pc.country_name_to_country_alpha2(country_name)
-        continent_code = pc.country_alpha2_to_continent_code(country_alpha2)
-        return pc.convert_continent_code_to_continent_name(continent_code)
-    except:
-        return "Other"
+        yield
+    finally:
+        active.record(name, time.perf_counter() - start)
+
+def profile(name):
+    """Context manager timing a block as one call of the current section (no-op when disabled)."""
+    active = getattr(_profile_state, 'profile', None)
+    return _NO_PROFILE if active is None else _timed(active, name)
+
+def profiled(name):
+    """Decorator version of profile(), e.g. @profiled('load:load_data')."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_profile_state, 'profile', None) is None:
+                return func(*args, **kwargs)
+            with profile(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def finish_profile():
+    """Closes the last section, shows the breakdown in the sidebar and appends it to PROFILE_LOG."""
+    active = getattr(_profile_state, 'profile', None)
+    if active is None:
+        return
+    _profile_state.profile = None
+    active.close_section()
+    record = active.as_dict()
+    record['figure_cache'] = get_figure_cache().stats()
 
-def calculate_age(birth_date):
-    if pd.isnull(birth_date): return None
-    today = date.today()
-    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+    with st.sidebar.expander(f"⏱️ Profile: {record['total_ms']:.0f} ms", expanded=False):
+        st.dataframe(
+            pd.DataFrame([{'section': s['section'], 'ms': s['ms']} for s in record['sections']]),
+            hide_index=True, use_container_width=True
+        )
+        calls = pd.DataFrame([{'section': s['section'], **c} for s in record['sections'] for c in s['calls']])
+        if not calls.empty:
+            st.dataframe(calls, hide_index=True, use_container_width=True)
+        st.caption(f"Figure cache: {record['figure_cache']['hits']} hits / {record['figure_cache']['misses']} misses")
+
+    with _profile_log_lock, open(PROFILE_LOG, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, default=str) + '\n')
+
+# --- 1. HELPER FUNCTIONS ---
+# get_continent / map_continents / age helpers: datalayer.py
 
 # --- 2. DATA LOADING (Centralized & Cached) ---
-@st.cache_data
+# Parsing, snapshots and the DataStore live in datalayer.py; one store per app process
+@st.cache_resource
+def get_data_store():
+    return DataStore(follow=os.environ.get(SHARED_DATA_ENV, '') not in ('', '0'))
+
+# The version a rerun works on, pinned by load_data() at the top of every page
+_data_state = threading.local()
+
+def data_version():
+    """DataVersion of the current rerun (the latest one outside a page)."""
+    version = getattr(_data_state, 'version', None)
+    return version if version is not None else get_data_store().refresh()
+
+def loaded_table(name):
+    return data_version().frames[SNAPSHOT_TABLES.index(name)]
+
+@st.cache_data(max_entries=2)
+def version_frames(fingerprint, _frames):
+    # st.cache_data hands every caller its own copy of the frames of one version
+    return _frames
+
+@profiled('load:load_data')
 def load_data():
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    data_dir = os.path.join(current_dir, 'data')
-    
-    athletes = pd.read_csv(os.path.join(data_dir, 'athletes.csv'))
-    medallists = pd.read_csv(os.path.join(data_dir, 'medallists.csv'))
-    nocs = pd.read_csv(os.path.join(data_dir, 'nocs.csv'))
-    events = pd.read_csv(os.path.join(data_dir, 'events.csv'))
-    
-    # 1. Clean Athletes Data
-    # Clean disciplines string: "['Swimming']" -> "Swimming"
-    athletes['disciplines'] = athletes['disciplines'].astype(str).str.replace(r"[\[\]']", "", regex=True)
-    
-    # Calculate Age
-    athletes['birth_date'] = pd.to_datetime(athletes['birth_date'], errors='coerce')
-    athletes['Age'] = athletes['birth_date'].apply(calculate_age)
-    
-    # Get Continent
-    athletes['Continent'] = athletes['country'].apply(get_continent)
-    
-    # 2. MERGE: Join Athletes info (Age, Gender) into Medallists
-    # We drop 'gender' from medallists first so we can replace it with the clean 'gender' from athletes
-    medallists = medallists.drop(columns=['gender'], errors='ignore')
-    
-    medallists = medallists.merge(
-        athletes[['code', 'Age', 'gender']], # Select only what we need to add/fix
-        left_on='code_athlete',              # Key in Medallists
-        right_on='code',                     # Key in Athletes
-        how='left'
-    )
-    
-    # 3. Final Polish for Medallists
-    medallists['Continent'] = medallists['country'].apply(get_continent)
-    
-    return athletes, medallists, nocs, events
+    """
+    (athletes, medallists, nocs, events) of the latest data version. Also pins that version
+    for the rest of the rerun, so the indexes built from it later (filters, facets, search)
+    match these frames even if a new file lands mid-run.
+    """
+    store = get_data_store()
+    version = store.refresh()
+    _data_state.version = version
+    if store.follow:
+        return version.frames # read-only mapped pages: shared as they are, a copy would undo the sharing
+    return version_frames(version.fingerprint, version.frames)
 
 
-# --- 3. SIDEBAR FILTER WIDGETS ---
-def create_sidebar(athletes_df):
+# --- 3. COUNTRY RESOLVER ---
+# load_country_index / country_lookup: datalayer.py (cached per process)
+
+# --- 4. SIDEBAR FILTER WIDGETS ---
+@st.cache_resource(max_entries=2)
+def cached_athlete_disciplines(version):
+    return build_athlete_disciplines(loaded_table('athletes'))
+
+def get_athlete_disciplines():
+    return cached_athlete_disciplines(data_version().tables['athletes'])
+
+def explode_disciplines(athletes_df):
+    """
+    Rows of the loaded athletes frame (e.g. filtered) repeated once per discipline, with a
+    'discipline' column: what per-sport counts and charts group on.
+    """
+    bridge = get_athlete_disciplines()
+    part = bridge[np.isin(bridge['row'].to_numpy(), athletes_df.index.to_numpy())]
+    return athletes_df.loc[part['row']].assign(discipline=part['discipline'].to_numpy())
+
+class FacetIndex:
+    """
+    Everything the sidebar needs to draw its widgets, computed once per dataset:
+    sorted option lists, continent -> countries, athlete counts per value (badges)
+    and the age bounds. Sports are counted per discipline through the bridge.
+    """
+    def __init__(self, athletes_df, disciplines=None):
+        disciplines = build_athlete_disciplines(athletes_df) if disciplines is None else disciplines
+        def counts(column):
+            sizes = athletes_df.groupby(column, observed=True).size()
+            return {value: int(n) for value, n in sorted(sizes.items()) if n > 0}
+
+        self.counts = {
+            'continent': counts('Continent'),
+            'country': counts('country'),
+            'sport': {value: int(n) for value, n in sorted(disciplines['discipline'].value_counts().items()) if n > 0},
+            'gender': counts('gender'),
+        }
+        self.continents = list(self.counts['continent'])
+        self.sports = list(self.counts['sport'])
+        self.genders = list(self.counts['gender'])
+        pairs = athletes_df.groupby(['Continent', 'country'], observed=True).size().index
+        self.countries_by_continent = {}
+        for continent, country in sorted(pairs):
+            self.countries_by_continent.setdefault(continent, []).append(country)
+        self.age_bounds = (int(athletes_df['Age'].min()), int(athletes_df['Age'].max()))
+
+    def countries(self, continents):
+        """Sorted countries of the given continents."""
+        if len(continents) == 1:
+            return self.countries_by_continent.get(continents[0], [])
+        return sorted({c for continent in continents for c in self.countries_by_continent.get(continent, [])})
+
+    def badge(self, facet):
+        """format_func for a multiselect: 'Europe (4,321)'."""
+        counts = self.counts[facet]
+        return lambda value: f"{value} ({counts.get(value, 0):,})"
+
+@st.cache_resource(max_entries=2)
+def cached_facet_index(version):
+    return FacetIndex(loaded_table('athletes'), get_athlete_disciplines())
+
+def get_facet_index():
+    return cached_facet_index(data_version().tables['athletes'])
+
+def create_sidebar(athletes_df=None):
+    # Options come from the cached facet index; pass a frame only to build facets for other data
+    facets = get_facet_index() if athletes_df is None else FacetIndex(athletes_df)
     st.sidebar.header("🌍 Global Filters")
 
     # 1. Continent
-    all_continents = sorted(athletes_df['Continent'].unique())
-    sel_continent = st.sidebar.multiselect("Select Continent", all_continents)
+    all_continents = facets.continents
+    sel_continent = st.sidebar.multiselect("Select Continent", all_continents, format_func=facets.badge('continent'))
     if not sel_continent: sel_continent = all_continents
 
     # 2. Country (Cascading)
-    available_countries = sorted(athletes_df[athletes_df['Continent'].isin(sel_continent)]['country'].unique())
-    sel_country = st.sidebar.multiselect("Select Country", available_countries)
+    available_countries = facets.countries(sel_continent)
+    sel_country = st.sidebar.multiselect("Select Country", available_countries, format_func=facets.badge('country'))
     if not sel_country: sel_country = available_countries
 
     # 3. Sport
-    all_sports = sorted(athletes_df['disciplines'].unique())
-    sel_sport = st.sidebar.multiselect("Select Sport", all_sports)
+    all_sports = facets.sports
+    sel_sport = st.sidebar.multiselect("Select Sport", all_sports, format_func=facets.badge('sport'))
     if not sel_sport: sel_sport = all_sports
 
     # 4. Gender
-    all_genders = sorted(athletes_df['gender'].dropna().unique())
-    sel_gender = st.sidebar.multiselect("Select Gender", all_genders)
+    all_genders = facets.genders
+    sel_gender = st.sidebar.multiselect("Select Gender", all_genders, format_func=facets.badge('gender'))
     if not sel_gender: sel_gender = all_genders
 
     # 5. Age
-    min_age = int(athletes_df['Age'].min())
-    max_age = int(athletes_df['Age'].max())
+    min_age, max_age = facets.age_bounds
     sel_age = st.sidebar.slider("Select Age Range", min_age, max_age, (min_age, max_age))
 
     # Return dictionary of selected filters
@@ -97,33 +280,579 @@ def create_sidebar(athletes_df):
         "age": sel_age
     }
     
-def get_iso3_code(country_name):
-    try:
-        # Fuzzy search handles "United States" -> "USA"
-        country = pycountry.countries.search_fuzzy(country_name)[0]
-        return country.alpha_3
-    except:
-        # Manual mappings for Olympic specific names
-        manual_map = {
-            'Great Britain': 'GBR',
-            'Korea': 'KOR',
-            'Chinese Taipei': 'TWN',
-            'Hong Kong, China': 'HKG',
-            'Refugee Olympic Team': None,
-            'Kosovo': 'XKX'
+# --- 5. FILTER ENGINE ---
+# Multi-valued filters: dataset -> {filter: bridge (row, value) builder}
+FILTER_BRIDGES = {'athletes': {'sport': get_athlete_disciplines}}
+
+# Loaded table behind each filterable dataset (the schedule is not part of the data store)
+FILTER_TABLES = {'athletes': 'athletes', 'medallists': 'medallists', 'medal_facts': 'medallists'}
+
+@st.cache_resource(max_entries=8)
+def cached_filter_index(dataset, version):
+    if dataset in DERIVED_DATASETS:
+        df = DERIVED_DATASETS[dataset]()
+    else:
+        df = loaded_table(dataset)
+    bridges = {key: build() for key, build in FILTER_BRIDGES.get(dataset, {}).items()}
+    return FilterIndex(df, FILTER_COLUMNS[dataset], bridges=bridges)
+
+def get_filter_index(dataset):
+    table = FILTER_TABLES.get(dataset)
+    return cached_filter_index(dataset, data_version().tables[table] if table else None)
+
+@profiled('filter:apply_filters')
+def apply_filters(df, filters, dataset, ignore=()):
+    """
+    Rows of `df` (one of the frames returned by load_data) matching the sidebar filters.
+    e.g. apply_filters(medallists_df, filters, 'medallists', ignore=('sport',))
+    """
+    return df.iloc[get_filter_index(dataset).select(filters, ignore)]
+
+# --- 6. MEDAL FACT TABLE ---
+@st.cache_resource(max_entries=2)
+def cached_medal_facts(version):
+    return build_medal_facts(loaded_table('medallists'))
+
+def get_medal_facts():
+    return cached_medal_facts(data_version().tables['medallists'])
+
+# --- 7. SCHEDULE ---
+@profiled('load:load_schedule')
+@st.cache_data
+def load_schedule(data_dir=DATA_DIR):
+    return read_schedule(data_dir)
+
+@st.cache_resource
+def get_schedule_lookups():
+    """
+    Lookup tables over load_schedule() rows:
+    - 'venues_by_sport': discipline -> sorted venue names
+    - 'sports': sorted discipline names
+    Per-venue / per-discipline row sets live in get_filter_index('schedule'), session
+    times in get_schedule_intervals(), per-day row sets in analytics.Analytics.
+    """
+    schedule = load_schedule()
+    pairs = schedule[['discipline', 'venue']].dropna().drop_duplicates()
+    venues_by_sport = {
+        sport: sorted(group['venue'].astype(str)) for sport, group in pairs.groupby('discipline', observed=True)
+    }
+    return {
+        'venues_by_sport': venues_by_sport,
+        'sports': sorted(schedule['discipline'].unique()),
+    }
+
+# Venue dimension: one row per schedule venue_code, joined to venues.csv through its tag.
+# Coordinates are per venue (data/venue_coordinates.csv), not per host city.
+VENUE_COORDINATES_FILE = 'venue_coordinates.csv'
+
+@profiled('load:load_venues')
+@st.cache_data
+def load_venues(data_dir=DATA_DIR):
+    """
+    One row per venue_code: venue (schedule name), official_name / tag / url (venues.csv),
+    city, lat, lon, location_codes, sports (sorted list) + sports_display, n_sports,
+    n_events, n_medal_events, n_sessions, first_session, last_session.
+    """
+    sessions = load_schedule(data_dir).dropna(subset=['venue_code'])
+    sessions = sessions.assign(venue_code=sessions['venue_code'].astype(str))
+    grouped = sessions.groupby('venue_code', sort=True)
+    venues = grouped.agg(
+        venue=('venue', 'first'), n_sessions=('venue', 'size'),
+        first_session=('start_date', 'min'), last_session=('end_date', 'max'),
+    )
+    venues['venue'] = venues['venue'].astype(str)
+
+    def sorted_lists(column):
+        pairs = sessions[['venue_code', column]].dropna().astype(str).drop_duplicates().sort_values(['venue_code', column])
+        return pairs.groupby('venue_code')[column].agg(list)
+
+    venues['location_codes'] = sorted_lists('location_code')
+    venues['sports'] = sorted_lists('discipline')
+    venues['sports_display'] = venues['sports'].str.join(', ')
+    venues['n_sports'] = venues['sports'].str.len()
+    events = sessions[['venue_code', 'discipline', 'event']].drop_duplicates()
+    venues['n_events'] = events.groupby('venue_code').size()
+    medal_events = sessions.loc[sessions['event_medal'] == 1, ['venue_code', 'discipline', 'event']].drop_duplicates()
+    venues['n_medal_events'] = medal_events.groupby('venue_code').size().reindex(venues.index, fill_value=0)
+
+    coordinates = pd.read_csv(os.path.join(data_dir, VENUE_COORDINATES_FILE), dtype={'venue_code': str})
+    official = pd.read_csv(os.path.join(data_dir, 'venues.csv'), usecols=['venue', 'tag', 'url'])
+    official = official.rename(columns={'venue': 'official_name'})
+    venues = venues.reset_index().merge(coordinates, on='venue_code', how='left').merge(official, on='tag', how='left')
+    for col in ('venue', 'venue_code', 'city', 'tag'):
+        venues[col] = venues[col].astype('category')
+    return venues
+
+def unmapped_venues():
+    """Schedule venues without coordinates (add them to data/venue_coordinates.csv)."""
+    venues = load_venues()
+    return sorted(venues.loc[venues['lat'].isna(), 'venue'].astype(str))
+
+DERIVED_DATASETS = {'medal_facts': get_medal_facts, 'schedule': load_schedule}
+
+# --- 8. LEVEL OF DETAIL (large charts) ---
+# Above this many points, distribution charts send server-side summaries instead of every point
+VIOLIN_POINT_BUDGET = 2000
+# Density grid points per violin half in the summary view (the outline is most of the payload)
+VIOLIN_GRID_SIZE = 8
+# Above this many sessions, the schedule Gantt draws per-period blocks instead of one bar per session
+GANTT_BAR_BUDGET = int(os.environ.get('DASHBOARD_GANTT_BAR_BUDGET', 500))
+GANTT_BLOCK_FREQ = {'All Dates': 'D', 'day': 'h'}
+
+@profiled('aggregate:schedule_blocks')
+@st.cache_data(max_entries=32)
+def schedule_blocks(rows, by, freq='D'):
+    """
+    Zoomed-out Gantt rows: one block per (`freq` period of the start time, `by`) over the
+    selected load_schedule() positions, from the first start to the last end of its sessions.
+    Columns: period, `by`, start_date, end_date, sessions, events, medal_sessions, venues, disciplines.
+    """
+    sessions = load_schedule().iloc[rows]
+    sessions = sessions.assign(period=sessions['start_date'].dt.floor(freq))
+    blocks = sessions.groupby(['period', by], observed=True, sort=True).agg(
+        start_date=('start_date', 'min'), end_date=('end_date', 'max'), sessions=('event', 'size'),
+        events=('event', 'nunique'), medal_sessions=('event_medal', 'sum'),
+        venues=('venue', 'nunique'), disciplines=('discipline', 'nunique'),
+    )
+    return blocks.reset_index()
+
+@profiled('aggregate:summarize_distribution')
+def summarize_distribution(df, value, by, grid_size=30, max_outliers=15, min_kde_size=8, seed=0):
+    """
+    Server-side violin summary of `value` per `by` group, so the browser gets a few
+    hundred numbers instead of one marker per row. Returns three DataFrames:
+    - stats: by + n, mean, q1, median, q3, lowerfence, upperfence (Tukey 1.5 IQR fences)
+    - curves: by + value, density (Gaussian KDE on a grid, same bandwidth rule as Plotly)
+    - points: by + value, the points still worth drawing: a sample of at most
+      `max_outliers` outliers per group, or every point of groups too small for a KDE
+    """
+    data = df[by + [value]].dropna()
+    groups = data.groupby(by, observed=True, sort=True)
+    keys = groups.size().reset_index()[by]
+    codes = groups.ngroup().to_numpy()
+    values = data[value].to_numpy(dtype=float)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(keys) + 1))
+    rng = np.random.default_rng(seed)
+
+    stats, curve_groups, curve_x, curve_y, point_rows = [], [], [], [], []
+    for g in range(len(keys)):
+        rows = order[bounds[g]:bounds[g + 1]]
+        vals = values[rows]
+        q1, median, q3 = np.quantile(vals, [0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        inside = vals[(vals >= q1 - 1.5 * iqr) & (vals <= q3 + 1.5 * iqr)]
+        stats.append((len(vals), vals.mean(), q1, median, q3, inside.min(), inside.max()))
+
+        if len(vals) < min_kde_size:
+            point_rows.append(rows)
+            continue
+        outside = rows[(vals < inside.min()) | (vals > inside.max())]
+        if len(outside) > max_outliers:
+            outside = rng.choice(outside, max_outliers, replace=False)
+        point_rows.append(outside)
+
+        # KDE over the distinct values (ages repeat a lot), weighted by their counts
+        distinct, counts = np.unique(vals, return_counts=True)
+        spread = min(vals.std(), iqr / 1.349) if iqr > 0 else vals.std()
+        bandwidth = 1.059 * spread * len(vals) ** -0.2 or 0.5
+        grid = np.linspace(vals.min() - 2 * bandwidth, vals.max() + 2 * bandwidth, grid_size)
+        density = (counts * np.exp(-0.5 * ((grid[:, None] - distinct) / bandwidth) ** 2)).sum(axis=1)
+        curve_groups.append(np.full(grid_size, g))
+        curve_x.append(grid)
+        curve_y.append(density / (len(vals) * bandwidth * np.sqrt(2 * np.pi)))
+
+    stats = pd.concat([keys, pd.DataFrame(stats, columns=['n', 'mean', 'q1', 'median', 'q3', 'lowerfence', 'upperfence'])], axis=1)
+    curve_groups = np.concatenate(curve_groups) if curve_groups else np.empty(0, dtype=int)
+    curves = keys.iloc[curve_groups].reset_index(drop=True)
+    curves[value] = np.concatenate(curve_x) if curve_x else []
+    curves['density'] = np.concatenate(curve_y) if curve_y else []
+    point_rows = np.sort(np.concatenate(point_rows)) if point_rows else np.empty(0, dtype=int)
+    points = data.iloc[point_rows].reset_index(drop=True)
+    return stats, curves, points
+
+# --- 9. ATHLETE SEARCH ---
+def normalize_name(text):
+    """Search key: accents folded, case folded, punctuation dropped ("Léon MARCHAND" -> "leon marchand")."""
+    folded = unicodedata.normalize('NFKD', str(text))
+    folded = ''.join(ch for ch in folded if not unicodedata.combining(ch)).casefold()
+    return ' '.join(''.join(ch if ch.isalnum() else ' ' for ch in folded).split())
+
+def single_deletions(token):
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+class AthleteSearchIndex:
+    """
+    Name search over the athletes frame, built once.
+    - tokens: sorted distinct name tokens (a prefix is one bisect range) with their row positions
+    - deletions: single-deletion variants -> tokens, for one-typo matches (symmetric delete)
+    - by_code / by_name: athlete code or normalized full name -> row position (O(1) profile lookup)
+    Results are row positions in the frame the index was built from.
+    """
+    MIN_TYPO_LENGTH = 4  # shorter tokens only match exactly or by prefix
+
+    def __init__(self, df):
+        keys = [normalize_name(name) for name in df['name']]
+        self.names = np.array(df['name'], dtype=object)
+        self.rank = np.empty(len(keys), dtype=np.int64)
+        self.rank[np.argsort(np.array(keys, dtype=object), kind='stable')] = np.arange(len(keys))
+        self.by_code = dict(zip(df['code'].tolist(), range(len(df))))
+        self.by_name = {}
+        postings = {}
+        for position, key in enumerate(keys):
+            self.by_name.setdefault(key, position)
+            for token in set(key.split()):
+                postings.setdefault(token, []).append(position)
+
+        self.tokens = sorted(postings)
+        self.postings = [np.array(postings[token], dtype=np.int64) for token in self.tokens]
+        self.token_ids = {token: i for i, token in enumerate(self.tokens)}
+        self.deletions = {}
+        for i, token in enumerate(self.tokens):
+            if len(token) >= self.MIN_TYPO_LENGTH:
+                for variant in single_deletions(token):
+                    self.deletions.setdefault(variant, []).append(i)
+
+    def lookup(self, key):
+        """Row position for an athlete code or a (normalized) full name, None if unknown."""
+        if key in self.by_code:
+            return self.by_code[key]
+        if str(key).isdigit() and int(key) in self.by_code:
+            return self.by_code[int(key)]
+        return self.by_name.get(normalize_name(key))
+
+    def match_token(self, query_token):
+        """{token id: score} for one query token: exact 3, prefix 2, one typo away 1."""
+        scores = {}
+        start = bisect.bisect_left(self.tokens, query_token)
+        stop = bisect.bisect_left(self.tokens, query_token + '\U0010ffff')
+        for i in range(start, stop):
+            scores[i] = 3 if self.tokens[i] == query_token else 2
+        if len(query_token) >= self.MIN_TYPO_LENGTH:
+            # token == query minus one char, query == token minus one char, or one substitution
+            candidates = [self.token_ids.get(v) for v in single_deletions(query_token)]
+            candidates += self.deletions.get(query_token, [])
+            for variant in single_deletions(query_token):
+                candidates += self.deletions.get(variant, [])
+            for i in candidates:
+                if i is not None:
+                    scores.setdefault(i, 1)
+        return scores
+
+    def search(self, query, limit=10, rows=None):
+        """
+        Row positions of the best `limit` matches for `query`, restricted to `rows`
+        (e.g. the filtered positions). Every query token must match some name token;
+        ties are broken alphabetically. An empty query lists names alphabetically.
+        """
+        allowed = None if rows is None else np.asarray(rows)
+        query_tokens = normalize_name(query).split()
+        if not query_tokens:
+            candidates = np.arange(len(self.names)) if allowed is None else allowed
+            return candidates[np.argsort(self.rank[candidates], kind='stable')[:limit]].tolist()
+
+        total = None
+        for query_token in query_tokens:
+            per_row = {}
+            for token_id, score in self.match_token(query_token).items():
+                for position in self.postings[token_id].tolist():
+                    if per_row.get(position, 0) < score:
+                        per_row[position] = score
+            if total is None:
+                total = per_row
+            else:
+                total = {position: total[position] + score for position, score in per_row.items() if position in total}
+            if not total:
+                return []
+
+        positions = np.fromiter(total, dtype=np.int64, count=len(total))
+        if allowed is not None:
+            positions = positions[np.isin(positions, allowed)]
+        scores = np.array([total[p] for p in positions.tolist()])
+        best = np.lexsort((self.rank[positions], -scores))[:limit]
+        return positions[best].tolist()
+
+@st.cache_resource(max_entries=2)
+def cached_athlete_search(version):
+    return AthleteSearchIndex(loaded_table('athletes'))
+
+def get_athlete_search():
+    return cached_athlete_search(data_version().tables['athletes'])
+
+# --- 10. FIGURE CACHE ---
+# Built Plotly figures, shared by every session. Streamlit serializes the figure itself on
+# each st.plotly_chart call (~1 ms); building it (px + data prep) is the expensive part.
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+def cached_figure(chart, build, filters=None, filter_keys=None, **params):
+    """
+    The figure `build()` returns, built once per data version and distinct (filters subset, params).
+    e.g. cached_figure('global/treemap', build_treemap, filters)
+         cached_figure('events/treemap', build_treemap, filters, ('continent', 'country', 'gender', 'age'), gold=True)
+    `build` must only depend on the data and what is in the key; the returned figure is shared, do not mutate it.
+    """
+    with profile(f'figure:{chart}'):
+        # After a reload the figures of the previous version are never hit again and age out of the LRU
+        key = f"{data_version().fingerprint}/{figure_key(chart, filters, filter_keys, **params)}"
+        return get_figure_cache().get_or_build(key, build)
+
+# --- 11. TEAM ROSTERS ---
+# teams.csv stores each roster as stringified lists; they are exploded once into bridge
+# tables with integer keys: team_id (row of the teams table) -> athlete / coach code.
+TEAM_LIST_COLUMNS = ['athletes', 'coaches', 'athletes_codes', 'coaches_codes', 'num_athletes', 'num_coaches']
+TEAM_CATEGORIES = ['team_gender', 'country_code', 'country', 'country_long', 'discipline', 'disciplines_code', 'events']
+
+def explode_code_lists(values):
+    """
+    "['1913366', '1913367']" per row -> (row positions, int codes), one entry per listed code,
+    parsed for all rows in one pass. Non-integer codes are skipped (historic rosters list
+    athletes absent from athletes.csv, e.g. 'A058159120057').
+    """
+    codes = values.reset_index(drop=True).fillna('').str.replace(r"[\[\]'\s]", '', regex=True).str.split(',').explode()
+    codes = pd.to_numeric(codes, errors='coerce').dropna()
+    return codes.index.to_numpy(dtype='int32'), codes.to_numpy(dtype='int32')
+
+@profiled('load:load_teams')
+@st.cache_data
+def load_teams(data_dir=DATA_DIR):
+    """
+    (teams, team_athletes, team_coaches).
+    teams: teams.csv without the list columns, plus team_id (int32, = row position),
+    roster_size (listed athletes) and n_coaches.
+    team_athletes / team_coaches: bridge tables (team_id, athlete_code) / (team_id, coach_code).
+    """
+    raw = pd.read_csv(os.path.join(data_dir, 'teams.csv'))
+    team_ids, athlete_codes = explode_code_lists(raw['athletes_codes'])
+    team_athletes = pd.DataFrame({'team_id': team_ids, 'athlete_code': athlete_codes})
+    team_ids, coach_codes = explode_code_lists(raw['coaches_codes'])
+    team_coaches = pd.DataFrame({'team_id': team_ids, 'coach_code': coach_codes})
+
+    teams = raw.drop(columns=TEAM_LIST_COLUMNS)
+    teams.insert(0, 'team_id', np.arange(len(teams), dtype='int32'))
+    teams['roster_size'] = (raw['athletes_codes'].str.count("'").fillna(0) // 2).astype('int16')
+    teams['n_coaches'] = np.bincount(team_ids, minlength=len(teams)).astype('int16')
+    for col in TEAM_CATEGORIES:
+        teams[col] = teams[col].astype('category')
+    return teams, team_athletes, team_coaches
+
+@st.cache_resource(max_entries=2)
+def cached_team_summary(version):
+    teams, team_athletes, _ = load_teams()
+    medallists = loaded_table('medallists')
+    won = medallists.loc[medallists['code_team'].notna(), ['code_team'] + MEDAL_IDENTITY].astype(str).drop_duplicates()
+    team_ids = pd.Index(teams['code']).get_indexer(won['code_team'])
+
+    summary = teams.set_index('team_id')
+    summary['members_linked'] = np.bincount(team_athletes['team_id'], minlength=len(teams)).astype('int16')
+    summary['medals'] = np.bincount(team_ids[team_ids >= 0], minlength=len(teams)).astype('int16')
+    summary['medals_per_member'] = (summary['medals'] / summary['roster_size'].where(summary['roster_size'] > 0)).fillna(0)
+    return summary
+
+def team_summary():
+    """
+    teams indexed by team_id, with roster_size, n_coaches, members_linked (roster members in the
+    team_athletes bridge), medals (distinct team medals, by code_team) and medals_per_member.
+    Join athletes through load_teams()[1] on team_id.
+    """
+    return cached_team_summary(data_version().tables['medallists'])
+
+# --- 12. RELATIONSHIP GRAPH ---
+# Coaches, officials, athletes and teams as integer-id adjacency lists, built once per data
+# version. Coach-centred questions (who does this coach train, what did they win) become
+# array slices instead of string parsing and scans.
+COACH_SEPARATORS = r'[,;/]|\band\b|\bet\b'
+
+def list_values(values):
+    """Stringified lists / plain strings ("['Judo', 'Sambo']") -> (row positions, stripped names)."""
+    names = values.reset_index(drop=True).fillna('').astype(str).str.replace(r"[\[\]']", '', regex=True).str.split(',').explode()
+    names = names.str.strip()
+    names = names[names != '']
+    return names.index.to_numpy(dtype='int32'), names.to_numpy(dtype=object)
+
+def name_key(text):
+    """Order-free name key: 'PEDRERO Ofelia' and 'Ofelia Pedrero (MEX)' give the same key."""
+    return ' '.join(sorted(normalize_name(text.split('(')[0]).split()))
+
+class Adjacency:
+    """One-to-many relation between integer ids, CSR layout: source -> sorted, distinct target ids."""
+    def __init__(self, sources, targets, n_sources):
+        pairs = np.unique(np.column_stack([sources, targets]).astype(np.int64), axis=0) if len(sources) else np.empty((0, 2), np.int64)
+        self.offsets = np.searchsorted(pairs[:, 0], np.arange(n_sources + 1))
+        self.targets = pairs[:, 1].astype(np.int32)
+
+    def __getitem__(self, source):
+        return self.targets[self.offsets[source]:self.offsets[source + 1]]
+
+    def degree(self):
+        return np.diff(self.offsets)
+
+    def degree_of(self, source):
+        return int(self.offsets[source + 1] - self.offsets[source])
+
+    def gather(self, sources):
+        """Distinct targets of several sources."""
+        parts = [self[source] for source in sources]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+
+    def transpose(self, n_targets):
+        sources = np.repeat(np.arange(len(self.offsets) - 1), self.degree())
+        return Adjacency(self.targets, sources, n_targets)
+
+class RelationGraph:
+    """
+    Ids are row positions: athletes / medallists in the loaded frames, coaches / officials in
+    self.coaches / self.officials, countries / disciplines in the sorted self.countries / self.disciplines.
+    - coach_athletes / athlete_coaches: shared team rosters (teams.csv) plus the athlete's free-text
+      'coach' matched by name against coaches.csv (same country preferred when a name is ambiguous)
+    - country_coaches (NOC code), discipline_coaches, discipline_officials
+    - athlete_medals: athlete -> medallists rows
+    """
+    def __init__(self, athletes_df, medallists_df, data_dir=DATA_DIR):
+        self.coaches = pd.read_csv(os.path.join(data_dir, 'coaches.csv'))
+        self.officials = pd.read_csv(os.path.join(data_dir, 'technical_officials.csv'))
+        self.medallists = medallists_df
+        n_athletes, n_coaches = len(athletes_df), len(self.coaches)
+        athlete_rows = pd.Index(athletes_df['code'])
+        coach_ids = pd.Index(self.coaches['code'])
+
+        # Free-text coach, cleaned once for display ("['SMITH John']" -> "SMITH John")
+        coach_text = athletes_df['coach'].astype(object).fillna('').astype(str)
+        self.coach_text = coach_text.str.replace(r"[\[\]']", '', regex=True).to_numpy(dtype=object)
+
+        # 1. coach -> athlete through team rosters
+        _, team_athletes, team_coaches = load_teams(data_dir)
+        shared = team_coaches.merge(team_athletes, on='team_id')
+        sources = [coach_ids.get_indexer(shared['coach_code'])]
+        targets = [athlete_rows.get_indexer(shared['athlete_code'])]
+
+        # 2. coach -> athlete through the athlete's coach text, one lookup per distinct (text, country)
+        by_key = {}
+        for coach, (name, country) in enumerate(zip(self.coaches['name'].astype(str), self.coaches['country_code'])):
+            by_key.setdefault(name_key(name), []).append((coach, country))
+        texts = pd.DataFrame({'text': self.coach_text, 'country': athletes_df['country_code'].astype(object).to_numpy()})
+        text_codes, distinct = pd.factorize(pd.MultiIndex.from_frame(texts))
+        matched = {}
+        for i, (text, country) in enumerate(distinct):
+            candidates = [c for part in re.split(COACH_SEPARATORS, text) for c in by_key.get(name_key(part), [])]
+            same_country = [coach for coach, code in candidates if code == country]
+            matched[i] = same_country or [coach for coach, _ in candidates]
+        counts = np.array([len(matched[code]) for code in text_codes])
+        sources.append(np.array([coach for code in text_codes for coach in matched[code]], dtype=np.int64))
+        targets.append(np.repeat(np.arange(n_athletes), counts))
+
+        sources, targets = np.concatenate(sources), np.concatenate(targets)
+        linked = (sources >= 0) & (targets >= 0)
+        self.coach_athletes = Adjacency(sources[linked], targets[linked], n_coaches)
+        self.athlete_coaches = self.coach_athletes.transpose(n_athletes)
+
+        # 3. country -> coaches, discipline -> coaches / officials
+        self.countries = sorted(self.coaches['country_code'].dropna().unique())
+        rows, disciplines = list_values(self.coaches['disciplines'])
+        official_rows, official_disciplines = list_values(self.officials['disciplines'])
+        self.disciplines = sorted(set(disciplines) | set(official_disciplines))
+        self.country_id = {code: i for i, code in enumerate(self.countries)}
+        self.discipline_id = {name: i for i, name in enumerate(self.disciplines)}
+        country_ids = pd.Index(self.countries).get_indexer(self.coaches['country_code'])
+        has_country = country_ids >= 0
+        self.country_coaches = Adjacency(country_ids[has_country], np.flatnonzero(has_country), len(self.countries))
+        self.discipline_coaches = Adjacency(pd.Index(self.disciplines).get_indexer(disciplines), rows, len(self.disciplines))
+        self.discipline_officials = Adjacency(pd.Index(self.disciplines).get_indexer(official_disciplines), official_rows, len(self.disciplines))
+
+        # 4. athlete -> medals won
+        medal_athletes = athlete_rows.get_indexer(medallists_df['code_athlete'])
+        won = medal_athletes >= 0
+        self.athlete_medals = Adjacency(medal_athletes[won], np.flatnonzero(won), n_athletes)
+
+    def coaches_of(self, athlete_row):
+        return self.coaches.iloc[self.athlete_coaches[athlete_row]]
+
+    def officials_of(self, discipline):
+        discipline_id = self.discipline_id.get(discipline)
+        return self.officials.iloc[self.discipline_officials[discipline_id] if discipline_id is not None else []]
+
+    def coaches_from(self, country_code):
+        country_id = self.country_id.get(country_code)
+        return self.coaches.iloc[self.country_coaches[country_id] if country_id is not None else []]
+
+    def coach_medals(self, coach):
+        """Medals won by the athletes of a coach (medallists rows, team medals counted once)."""
+        rows = self.athlete_medals.gather(self.coach_athletes[coach])
+        return count_medals(self.medallists.iloc[rows])
+
+    def coach_summary(self, coach):
+        """{'name', 'function', 'athletes', 'medals'} for one coach id."""
+        record = self.coaches.iloc[coach]
+        return {
+            'name': record['name'], 'function': record['function'],
+            'athletes': self.coach_athletes.degree_of(coach), 'medals': len(self.coach_medals(coach)),
         }
-        return manual_map.get(country_name, None)
-    
-    
+
+@st.cache_resource(max_entries=2)
+def cached_relation_graph(athletes_version, medallists_version):
+    return RelationGraph(loaded_table('athletes'), loaded_table('medallists'))
+
+@profiled('load:relation_graph')
+def get_relation_graph():
+    tables = data_version().tables
+    return cached_relation_graph(tables['athletes'], tables['medallists'])
+
+# --- 13. VENUE OCCUPANCY ---
+OCCUPANCY_BINS = {'All Dates': pd.Timedelta(hours=1), 'day': pd.Timedelta(minutes=15)}
+
+# Sweep-line engine: datalayer.ScheduleIntervals, built once per process
+@st.cache_resource
+def get_schedule_intervals():
+    return ScheduleIntervals(load_schedule())
+
+@profiled('aggregate:venue_occupancy')
+@st.cache_data(max_entries=32)
+def venue_occupancy(rows, by='venue', freq=OCCUPANCY_BINS['All Dates']):
+    """(heatmap grid, per-group summary) of the selected schedule rows, cached per row set."""
+    intervals = get_schedule_intervals()
+    return intervals.occupancy_grid(rows, by, freq), intervals.summary(rows, by)
 
 def count_medals(df):
     """
     Counts medals correctly by handling team sports.
-    Drops duplicate rows for the same Event + Country + Medal Type.
+    Keeps one row per medal: team members share their code_team (same rule as the medal fact table).
     """
     if df.empty:
         return df
     
-    # We keep only ONE row per Country per Event per Medal Type
-    # e.g., Merges 19 Moroccan Football players into 1 row
-    return df.drop_duplicates(subset=['country', 'discipline', 'event', 'medal_type'])
\ No newline at end of file
+    # e.g., Merges 19 Moroccan Football players (one code_team) into 1 row
+    return df[~df[MEDAL_IDENTITY].assign(holder=medal_holders(df)).duplicated()]
+
+# --- 14. ANALYTICS API ---
+# One analytics.Analytics per data version, shared by every session and fed with the per-table
+# caches above (get_medal_facts(), ...) so nothing is built twice.
+@st.cache_resource(max_entries=2)
+def cached_analytics(fingerprint):
+    sources = {
+        'athlete_disciplines': get_athlete_disciplines, 'medal_facts': get_medal_facts,
+        'filter_index': get_filter_index, 'schedule_intervals': get_schedule_intervals,
+    }
+    return analytics.Analytics(*data_version().frames, schedule=load_schedule(), sources=sources, timer=profile)
+
+def get_analytics():
+    """Analytics of the data version pinned by load_data() for this rerun."""
+    return cached_analytics(data_version().fingerprint)
+
+
+if __name__ == "__main__":
+    # Build step, e.g. in the container image or before a restart:
+    #   python utils.py [--force]
+    # Builder process for servers started with DASHBOARD_SHARED_DATA=1 (see SHARED_DATA_ENV):
+    #   python utils.py --watch [seconds]
+    import sys
+    if '--watch' in sys.argv[1:]:
+        rest = sys.argv[sys.argv.index('--watch') + 1:]
+        watch_sources(float(rest[0]) if rest else 5.0)
+    print(build_snapshot(force='--force' in sys.argv[1:]))
+    missing = unresolved_countries()
+    if missing:
+        print(f"Unresolved countries ({len(missing)}): {', '.join(missing)}")
+    unmapped = unmapped_venues()
+    if unmapped:
+        print(f"Venues without coordinates ({len(unmapped)}): {', '.join(unmapped)}")